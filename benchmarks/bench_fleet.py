@@ -0,0 +1,251 @@
+"""
+Fleet-scale collection benchmark
+
+Runs full collection cycles (read, parse, format and write every chamber) against a local
+emulator (see enviratron_logger/emulator.py) at 10, 100 and 1000 chambers and reports:
+
+  * cycle wall time
+  * p50 / p99 per-request latency
+  * CPU time spent parsing, formatting and writing
+  * peak RSS of the logger process
+
+Each fleet size is run in a fresh child process so that peak RSS is not carried over, and the
+emulator runs in its own process so that it doesn't show up in the logger's numbers. Results are
+written as JSON so that they can be compared between releases:
+
+    python benchmarks/bench_fleet.py --output fleet-1.0.0.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / "enviratron_logger"
+sys.path.insert(0, str(PACKAGE_DIR))
+
+DEFAULT_SIZES = (10, 100, 1000)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_emulator(args):
+    port = free_port()
+    emulator = subprocess.Popen(
+        [
+            sys.executable, str(PACKAGE_DIR / "emulator.py"),
+            "--port", str(port),
+            "--latency", str(args.latency),
+            "--jitter", str(args.jitter),
+            "--seed", "1",
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+
+    # Wait for it to start listening:
+    deadline = time.monotonic() + 10
+
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    return emulator, "http://127.0.0.1:{}/{{}}".format(port)
+
+
+def run_size(chambers, args):
+    """Runs the benchmark for one fleet size in this process and returns the results dict"""
+
+    import enviratron_logger as el
+    from chamber import GrowthChamberControl as gcc
+    from collector import collect
+
+    latencies = []
+    cpu = {"parse": 0.0, "format": 0.0, "write": 0.0}
+
+    # Instrument the hot spots:
+    parse = gcc._GrowthChamberControl__parse_percival_response
+    get_state = gcc.get_state
+
+    def timed_parse(self, resp_bytes):
+        start = time.thread_time()
+        try:
+            return parse(self, resp_bytes)
+        finally:
+            cpu["parse"] += time.thread_time() - start
+
+    def timed_get_state(self):
+        start = time.perf_counter()
+        try:
+            return get_state(self)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    gcc._GrowthChamberControl__parse_percival_response = timed_parse
+    gcc.get_state = timed_get_state
+
+    emulator, base_url = start_emulator(args)
+    gcc.BASE_URL = base_url
+
+    try:
+        with tempfile.TemporaryDirectory() as log_dir:
+            chamber_ids = list(range(1, chambers + 1))
+            loggers = {i: el.get_logger(i, log_dir_path=Path(log_dir)) for i in chamber_ids}
+
+            for logger in loggers.values():
+                for handler in logger.handlers:
+                    formatter = handler.formatter
+                    format_record = formatter.format
+                    emit = handler.emit
+
+                    def timed_format(record, format_record=format_record):
+                        start = time.process_time()
+                        try:
+                            return format_record(record)
+                        finally:
+                            cpu["format"] += time.process_time() - start
+
+                    def timed_emit(record, emit=emit):
+                        start = time.process_time()
+                        format_before = cpu["format"]
+                        try:
+                            return emit(record)
+                        finally:
+                            # emit() formats too, only count the remainder as writing:
+                            cpu["write"] += (
+                                time.process_time() - start - (cpu["format"] - format_before)
+                            )
+
+                    formatter.format = timed_format
+                    handler.emit = timed_emit
+
+            # One warm-up cycle to open connections and load everything:
+            collect(chamber_ids, max_concurrency=args.max_concurrency)
+            latencies.clear()
+            cpu.update(parse=0.0, format=0.0, write=0.0)
+
+            cycle_times = []
+            errors = 0
+
+            for _ in range(args.cycles):
+                start = time.perf_counter()
+                states = collect(chamber_ids, max_concurrency=args.max_concurrency)
+                for chamber_id, state in states.items():
+                    errors += "type" in state
+                    el.log_state(loggers[chamber_id], state)
+                cycle_times.append(time.perf_counter() - start)
+
+            el.retain_loggers(())
+    finally:
+        emulator.terminate()
+        emulator.wait()
+
+    return {
+        "chambers": chambers,
+        "cycles": args.cycles,
+        "errors": errors,
+        "cycle_wall_s": {
+            "median": statistics.median(cycle_times),
+            "min": min(cycle_times),
+            "max": max(cycle_times),
+        },
+        "request_latency_s": {
+            "p50": percentile(latencies, 0.50),
+            "p99": percentile(latencies, 0.99),
+        },
+        "cpu_per_cycle_s": {k: v / args.cycles for k, v in cpu.items()},
+        # ru_maxrss is in kilobytes on Linux:
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--max-concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.02, help="emulator median latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="emulator latency sigma")
+    parser.add_argument("--output", default="bench_fleet.json")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_size(args.child, args)))
+        return
+
+    results = []
+
+    for size in args.sizes:
+        child = subprocess.run(
+            [
+                sys.executable, __file__,
+                "--child", str(size),
+                "--cycles", str(args.cycles),
+                "--max-concurrency", str(args.max_concurrency),
+                "--latency", str(args.latency),
+                "--jitter", str(args.jitter),
+            ],
+            check=True,
+            stdout=subprocess.PIPE,
+        )
+        result = json.loads(child.stdout.decode().strip().splitlines()[-1])
+        results.append(result)
+        print(
+            "{chambers:5d} chambers: cycle {wall:7.3f}s  p50 {p50:6.1f}ms  p99 {p99:6.1f}ms  "
+            "cpu parse/format/write {parse:.3f}/{format:.3f}/{write:.3f}s  rss {rss:,}kB  "
+            "errors {errors}".format(
+                chambers=result["chambers"],
+                wall=result["cycle_wall_s"]["median"],
+                p50=result["request_latency_s"]["p50"] * 1000,
+                p99=result["request_latency_s"]["p99"] * 1000,
+                rss=result["peak_rss_kb"],
+                errors=result["errors"],
+                **result["cpu_per_cycle_s"],
+            )
+        )
+
+    report = {
+        "benchmark": "fleet",
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "cycles": args.cycles,
+            "max_concurrency": args.max_concurrency,
+            "latency": args.latency,
+            "jitter": args.jitter,
+        },
+        "results": results,
+    }
+
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+
+    print("results written to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
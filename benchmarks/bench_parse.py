@@ -0,0 +1,118 @@
+"""
+Micro-benchmark for GrowthChamberControl.__parse_percival_response
+
+Compares the table-driven parser against the previous iterwalk based implementation on a
+realistic read_data.xml payload (the full get_state() tag set).
+
+    python benchmarks/bench_parse.py [iterations]
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "enviratron_logger"))
+
+from lxml import etree
+from chamber import GrowthChamberControl as gcc
+
+
+STATE_PAYLOAD = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b"<Req>"
+    b"<PV_3>502 PPM</PV_3>"
+    b"<CM_SP_3_Manual>500 PPM</CM_SP_3_Manual>"
+    b"<PV_2>72.0 %RH</PV_2>"
+    b"<CM_SP_2_Manual>74.0 %RH</CM_SP_2_Manual>"
+    b"<CLC_Enable_Rh_1>Yes</CLC_Enable_Rh_1>"
+    b"<CLC_Enable_Rh_2>Yes</CLC_Enable_Rh_2>"
+    b"<EO_1_Dim>10000 %</EO_1_Dim>"
+    b"<EO_2_Dim>10000 %</EO_2_Dim>"
+    b"<EO_3_Dim>10000 %</EO_3_Dim>"
+    b"<EO_4_Dim>10000 %</EO_4_Dim>"
+    b"<EO_5_Dim>10000 %</EO_5_Dim>"
+    b"<EO_6_Dim>10000 %</EO_6_Dim>"
+    b"<EO_7_Dim>10000 %</EO_7_Dim>"
+    b"<PV_1>26.0 C</PV_1>"
+    b"<CM_SP_1_Manual>26.0 C</CM_SP_1_Manual>"
+    b"<EO_14_On_Off>Off</EO_14_On_Off>"
+    b"<PV_5>98.0 %WC</PV_5>"
+    b"<CM_SP_5_Manual>0.0 %WC</CM_SP_5_Manual>"
+    b"<EO_13_On_Off>Off</EO_13_On_Off>"
+    b"<EO_15_On_Off>Off</EO_15_On_Off>"
+    b"<CM_NON_RAMPING_MODE>Manual</CM_NON_RAMPING_MODE>"
+    b"</Req>"
+)
+
+
+def legacy_parse(chamber_id, resp_str, tag_map):
+    """The iterwalk based parser that __parse_percival_response used to be"""
+
+    resp_dict = {}
+    r_xml = etree.fromstring(resp_str)
+    context = etree.iterwalk(r_xml, events=("start",))
+
+    for action, elem in context:
+
+        if elem.tag == 'Req':
+            continue
+
+        if elem.tag.endswith('_Dim'):
+            val = int(elem.text.rstrip(" %"))
+
+        elif elem.tag.endswith('_On_Off'):
+
+            if elem.text == 'On':
+                val = True
+            else:
+                val = False
+
+        else:
+
+            try:
+
+                val = float(elem.text.split(" ")[0])
+            except ValueError:
+
+                if elem.text == 'No':
+                    val = False
+                elif elem.text == 'Yes':
+                    val = True
+                else:
+                    val = elem.text
+
+        resp_dict[tag_map.get(elem.tag)] = val
+        resp_dict['chamber_id'] = chamber_id
+        resp_dict['env_var'] = tag_map.get(elem.tag).split("_")[0]
+        resp_dict['env_val'] = val
+
+    return resp_dict
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    chamber = gcc(1)
+    tag_map = gcc._GrowthChamberControl__tag_map
+    fast_parse = chamber._GrowthChamberControl__parse_percival_response
+    # The old code path decoded the response to text first:
+    payload_text = STATE_PAYLOAD.decode("utf-8").split("?>", 1)[1]
+
+    legacy = legacy_parse(1, payload_text, tag_map)
+    fast = fast_parse(STATE_PAYLOAD)
+    assert list(legacy.items()) == list(fast.items()), "parsers disagree"
+
+    legacy_time = timeit.timeit(
+        lambda: legacy_parse(1, STATE_PAYLOAD.decode("utf-8").split("?>", 1)[1], tag_map),
+        number=iterations,
+    )
+    fast_time = timeit.timeit(lambda: fast_parse(STATE_PAYLOAD), number=iterations)
+
+    print(f"payload: {len(STATE_PAYLOAD)} bytes, {len(fast) - 3} values, {iterations} iterations")
+    print(f"legacy iterwalk parser: {legacy_time / iterations * 1e6:8.2f} us/response")
+    print(f"table-driven parser:    {fast_time / iterations * 1e6:8.2f} us/response")
+    print(f"speed-up:               {legacy_time / fast_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
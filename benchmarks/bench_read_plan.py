@@ -0,0 +1,63 @@
+"""
+Micro-benchmark for the precompiled read plans of GrowthChamberControl
+
+Compares building the get_state() request the way __request_chamber_values used to (a payload
+dict with the tags mapped through __rev_tag_map on every call, URL-encoded by requests) against
+looking up the compiled plan and handing requests its ready-made URL. Both sides are timed up to
+and including requests' PreparedRequest, which is what Session.get() sends; no network is involved.
+
+    python benchmarks/bench_read_plan.py [iterations]
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "enviratron_logger"))
+
+import requests
+from chamber import GrowthChamberControl as gcc
+
+
+def legacy_request(chamber, tags_list, rev_tag_map):
+    """The request __request_chamber_values used to build for every read"""
+
+    payload = {"Cmd": "read", "Tag": [rev_tag_map.get(tag) for tag in tags_list]}
+    return requests.Request(
+        "GET", chamber.base_url + "/read_data.xml", params=payload
+    ).prepare()
+
+
+def planned_request(get_read_plan, tags_list):
+    return requests.Request("GET", get_read_plan(tags_list).url).prepare()
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    chamber = gcc(1)
+    rev_tag_map = gcc._GrowthChamberControl__rev_tag_map
+    get_read_plan = chamber._GrowthChamberControl__get_read_plan
+    tags_list = list(gcc.STATE_TAGS)
+
+    legacy = legacy_request(chamber, tags_list, rev_tag_map)
+    planned = planned_request(get_read_plan, tags_list)
+    assert legacy.url == planned.url, "request URLs differ"
+
+    legacy_time = timeit.timeit(
+        lambda: legacy_request(chamber, tags_list, rev_tag_map), number=iterations
+    )
+    plan_time = timeit.timeit(lambda: get_read_plan(tags_list), number=iterations)
+    planned_time = timeit.timeit(
+        lambda: planned_request(get_read_plan, tags_list), number=iterations
+    )
+
+    print(f"url: {len(planned.url)} chars, {len(tags_list)} tags, {iterations} iterations")
+    print(f"payload dict + requests encoding: {legacy_time / iterations * 1e6:8.2f} us/request")
+    print(f"read plan lookup only:            {plan_time / iterations * 1e6:8.2f} us/request")
+    print(f"read plan + requests prepare:     {planned_time / iterations * 1e6:8.2f} us/request")
+    print(f"speed-up:                         {legacy_time / planned_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Incrementally maintained aggregates
+
+Instead of recomputing rollups from the raw logs, an AggregateSink folds every reading into running
+per-minute, per-hour and per-day buckets (count, sum, min, max and sum of squares of every numeric
+field) as it is collected, and keeps them in a small SQLite table:
+
+    sink = AggregateSink("aggregates.sqlite3")
+    sink.write_cycle(collect([1, 2, 3]))
+    sink.query(1, "temperature_actual", "1h", start=datetime(2021, 9, 15))
+
+A query reads one row per bucket and never touches a raw record. Buckets are aligned to local
+time, like the log timestamps, so daily buckets start at midnight.
+"""
+
+import math
+import sqlite3
+from datetime import datetime, timedelta
+
+from binary_log import FLOAT_FIELDS
+from records import DEFAULT_MAX_DELAY, BufferedSink, as_logged, is_number, is_reading
+
+# Bucket name => width in seconds:
+DEFAULT_WIDTHS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+_LOCAL_EPOCH = datetime(1970, 1, 1)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS aggregates (
+    chamber_id INTEGER NOT NULL,
+    width TEXT NOT NULL,
+    field TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    sumsq REAL NOT NULL,
+    PRIMARY KEY (chamber_id, width, field, bucket)
+) WITHOUT ROWID;
+"""
+
+_UPSERT = """
+INSERT INTO aggregates (chamber_id, width, field, bucket, count, sum, min, max, sumsq)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (chamber_id, width, field, bucket) DO UPDATE SET
+    count = count + excluded.count,
+    sum = sum + excluded.sum,
+    min = min(min, excluded.min),
+    max = max(max, excluded.max),
+    sumsq = sumsq + excluded.sumsq
+"""
+
+
+def local_seconds(timestamp):
+    """Epoch seconds => seconds since 1970-01-01 on the local clock, so buckets follow local time"""
+
+    moment = datetime.fromtimestamp(timestamp)
+    return (moment - _LOCAL_EPOCH).total_seconds()
+
+
+def _to_local_seconds(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return (value - _LOCAL_EPOCH).total_seconds()
+
+
+class AggregateSink(BufferedSink):
+    """Keeps running aggregates of every numeric field per chamber and bucket width
+
+    A sink (see records.py): readings are folded into in-memory partial buckets and merged into
+    the table in one transaction per batch, see BufferedSink.
+    """
+
+    def __init__(self, path, widths=None, batch_size=0, max_delay=DEFAULT_MAX_DELAY):
+        super(AggregateSink, self).__init__(batch_size=batch_size, max_delay=max_delay)
+        self.path = str(path)
+        self.widths = dict(widths or DEFAULT_WIDTHS)
+        self.__connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.executescript(_SCHEMA)
+        # (chamber_id, width, field, bucket) => [count, sum, min, max, sumsq]:
+        self.__pending = {}
+
+    def _buffer(self, state, timestamp):
+        if not is_reading(state):
+            return
+
+        # Aggregated on the same 0-100 lighting scale as the JSON logs:
+        state = as_logged(state)
+        chamber_id = state["chamber_id"]
+        seconds = local_seconds(timestamp)
+        buckets = [(name, int(seconds // width) * width) for name, width in self.widths.items()]
+        pending = self.__pending
+
+        for field in FLOAT_FIELDS:
+            value = state.get(field)
+            # Missing, a flag, a reading the controller sent as text (e.g. "----"), or NaN:
+            if not is_number(value) or math.isnan(value):
+                continue
+
+            for name, bucket in buckets:
+                key = (chamber_id, name, field, bucket)
+                partial = pending.get(key)
+
+                if partial is None:
+                    pending[key] = [1, value, value, value, value * value]
+                else:
+                    partial[0] += 1
+                    partial[1] += value
+                    if value < partial[2]:
+                        partial[2] = value
+                    if value > partial[3]:
+                        partial[3] = value
+                    partial[4] += value * value
+
+    def _write(self):
+        if self.__pending:
+            with self.__connection:
+                self.__connection.executemany(
+                    _UPSERT, [(*key, *partial) for key, partial in self.__pending.items()]
+                )
+
+        self.__pending = {}
+
+    def _close(self):
+        self.__connection.close()
+
+    def query(self, chamber_id, field, width="1h", start=None, end=None):
+        """Returns one dict per bucket of `field` that overlaps start..end, oldest first
+
+        Each has the bucket "start" (a local datetime), "count", "sum", "min", "max", "sumsq" and
+        the derived "mean" and (population) "stddev". Readings still waiting to be written are
+        not included, flush() first to see them.
+        """
+
+        if width not in self.widths:
+            raise ValueError(f"unknown bucket width {width!r}, expected one of {list(self.widths)}")
+
+        sql = (
+            "SELECT bucket, count, sum, min, max, sumsq FROM aggregates"
+            " WHERE chamber_id = ? AND width = ? AND field = ?"
+        )
+        params = [chamber_id, width, field]
+
+        if start is not None:
+            # The bucket that start falls into is included:
+            sql += " AND bucket > ?"
+            params.append(_to_local_seconds(start) - self.widths[width])
+        if end is not None:
+            sql += " AND bucket < ?"
+            params.append(_to_local_seconds(end))
+
+        sql += " ORDER BY bucket"
+
+        with self._lock:
+            rows = self.__connection.execute(sql, params).fetchall()
+
+        results = []
+        for bucket, count, total, minimum, maximum, sumsq in rows:
+            mean = total / count
+            results.append(
+                {
+                    "start": _LOCAL_EPOCH + timedelta(seconds=bucket),
+                    "count": count,
+                    "sum": total,
+                    "min": minimum,
+                    "max": maximum,
+                    "sumsq": sumsq,
+                    "mean": mean,
+                    # Rounding can take it a hair below zero for constant values:
+                    "stddev": math.sqrt(max(sumsq / count - mean * mean, 0.0)),
+                }
+            )
+
+        return results
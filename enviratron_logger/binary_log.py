@@ -0,0 +1,287 @@
+"""
+Fixed-width binary chamber logs
+
+A reading is ~700 bytes of JSON but only ~20 numbers and flags, so this format stores each one as a
+fixed 80 byte record after a 16 byte file header:
+
+    offset  type        field
+    0       float64     timestamp (epoch seconds)
+    8       uint16      chamber_id
+    10      uint8       flags, one bit per FLAG_FIELDS entry
+    11      uint8       flags_valid, which of those bits were present in the reading
+    12      uint8       operating_mode, the index into OPERATING_MODES (0 if missing, 255 if the
+                        mode isn't one of them)
+    13      3 bytes     padding
+    16      float32 x15 FLOAT_FIELDS, NaN if missing or not a number
+    76      4 bytes     padding
+
+Lighting is stored on the same 0-100 scale as the JSON logs. Error records are not stored, they stay
+in the JSON logs. Because every record has the same width a file can be memory-mapped and viewed as
+a NumPy structured array without parsing anything:
+
+    readings = read_array("chamber_logs/chamber_1_environment.bin")
+    readings["temperature_actual"].mean()
+
+NumPy is optional (`pip install numpy`); without it iter_records() decodes records with struct.
+"""
+
+import logging
+import math
+import mmap
+import struct
+import threading
+import time
+from pathlib import Path
+
+from records import as_logged, is_reading
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy is an optional extra
+    numpy = None
+
+binary_logger = logging.getLogger("enviratron_binary_log")
+
+MAGIC = b"ENVB"
+VERSION = 1
+# magic, version, record size, 8 reserved bytes:
+HEADER = struct.Struct("<4sHH8x")
+
+FLOAT_FIELDS = (
+    "co2_actual",
+    "co2_target",
+    "humidity_actual",
+    "humidity_target",
+    *(f"lighting_{i}" for i in range(1, 8)),
+    "temperature_actual",
+    "temperature_target",
+    "watering_actual",
+    "watering_target",
+)
+FLAG_FIELDS = (
+    "humidification_enabled",
+    "dehumidification_enabled",
+    "air_diverter_state",
+    "door_state",
+    "curtain_state",
+)
+# Index 0 is reserved for a missing mode:
+OPERATING_MODES = (None, "Manual", "Ramping Manual", "Diurnal", "DLI", "Program", "Sequence")
+# Stored for a mode that isn't in OPERATING_MODES, and read back as UNKNOWN_MODE_NAME:
+UNKNOWN_MODE = 255
+UNKNOWN_MODE_NAME = "unknown"
+
+RECORD = struct.Struct(f"<dHBBB3x{len(FLOAT_FIELDS)}f4x")
+RECORD_SIZE = RECORD.size
+
+_MODE_INDEX = {mode: i for i, mode in enumerate(OPERATING_MODES) if mode is not None}
+# Modes that were already warned about, so a chamber left in one doesn't warn every reading:
+_unknown_modes = set()
+
+if numpy is not None:
+    DTYPE = numpy.dtype(
+        {
+            "names": [
+                "timestamp",
+                "chamber_id",
+                "flags",
+                "flags_valid",
+                "operating_mode",
+                *FLOAT_FIELDS,
+            ],
+            "formats": ["<f8", "<u2", "u1", "u1", "u1", *(["<f4"] * len(FLOAT_FIELDS))],
+            "offsets": [0, 8, 10, 11, 12, *range(16, 16 + 4 * len(FLOAT_FIELDS), 4)],
+            "itemsize": RECORD_SIZE,
+        }
+    )
+else:
+    DTYPE = None
+
+
+def _to_float(value):
+    # None for a missing value, or e.g. a reading the controller sent as "----":
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _mode_index(mode):
+    if mode is None:
+        return 0
+
+    index = _MODE_INDEX.get(mode)
+    if index is None:
+        if mode not in _unknown_modes:
+            _unknown_modes.add(mode)
+            binary_logger.warning(
+                "operating mode %r isn't in OPERATING_MODES, stored as unknown", mode
+            )
+        return UNKNOWN_MODE
+
+    return index
+
+
+def pack(state, timestamp):
+    """Packs a reading sampled at `timestamp` (epoch seconds) into one record"""
+
+    flags = 0
+    flags_valid = 0
+    for bit, key in enumerate(FLAG_FIELDS):
+        value = state.get(key)
+        if value is not None:
+            flags_valid |= 1 << bit
+            if value:
+                flags |= 1 << bit
+
+    logged = as_logged(state)
+    values = [_to_float(logged.get(key)) for key in FLOAT_FIELDS]
+
+    return RECORD.pack(
+        timestamp,
+        state["chamber_id"],
+        flags,
+        flags_valid,
+        _mode_index(state.get("operating_mode")),
+        *values,
+    )
+
+
+def unpack(record):
+    """Turns one record back into a reading dict (missing values are left out)"""
+
+    timestamp, chamber_id, flags, flags_valid, mode, *values = RECORD.unpack(record)
+    state = {"timestamp": timestamp, "chamber_id": chamber_id}
+
+    for key, value in zip(FLOAT_FIELDS, values):
+        if not math.isnan(value):
+            state[key] = value
+
+    for bit, key in enumerate(FLAG_FIELDS):
+        if flags_valid & (1 << bit):
+            state[key] = bool(flags & (1 << bit))
+
+    if mode == UNKNOWN_MODE:
+        state["operating_mode"] = UNKNOWN_MODE_NAME
+    elif mode:
+        state["operating_mode"] = OPERATING_MODES[mode]
+
+    return state
+
+
+def _check_header(header, path):
+    magic, version, record_size = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"{path} is not a version {VERSION} binary chamber log")
+
+
+def _record_count(size):
+    # A record cut short by a crash mid-write is ignored:
+    return max(0, size - HEADER.size) // RECORD_SIZE
+
+
+def iter_records(path):
+    """Yields every record in a binary log as a dict, oldest first"""
+
+    with open(path, "rb") as log_file:
+        _check_header(log_file.read(HEADER.size), path)
+        count = _record_count(Path(path).stat().st_size)
+
+        for _ in range(count):
+            yield unpack(log_file.read(RECORD_SIZE))
+
+
+def read_array(path):
+    """Memory-maps a binary log as a read-only NumPy structured array of DTYPE records"""
+
+    if numpy is None:
+        raise RuntimeError("read_array() needs numpy, pip install numpy")
+
+    with open(path, "rb") as log_file:
+        _check_header(log_file.read(HEADER.size), path)
+        count = _record_count(Path(path).stat().st_size)
+        if count == 0:
+            return numpy.empty(0, dtype=DTYPE)
+
+        # The map stays valid after the file is closed, the array keeps it alive:
+        mapped = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return numpy.frombuffer(mapped, dtype=DTYPE, count=count, offset=HEADER.size)
+
+
+def binary_path_for(log_dir_path, chamber_id):
+    return Path(log_dir_path) / f"chamber_{chamber_id}_environment.bin"
+
+
+class BinarySink:
+    """Appends every reading to a per-chamber binary log in `log_dir_path`; a sink, see records.py"""
+
+    def __init__(self, log_dir_path):
+        self.log_dir_path = Path(log_dir_path)
+        self.__files = {}
+        self.__lock = threading.Lock()
+
+    def __file_for(self, chamber_id):
+        log_file = self.__files.get(chamber_id)
+
+        if log_file is None:
+            path = binary_path_for(self.log_dir_path, chamber_id)
+            log_file = open(path, "ab")
+
+            if log_file.tell() == 0:
+                log_file.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE))
+            else:
+                with open(path, "rb") as existing:
+                    _check_header(existing.read(HEADER.size), path)
+                # Drop a record cut short by a crash so the ones after it stay aligned:
+                end = HEADER.size + _record_count(log_file.tell()) * RECORD_SIZE
+                if log_file.tell() != end:
+                    log_file.truncate(end)
+
+            self.__files[chamber_id] = log_file
+
+        return log_file
+
+    def __write(self, state, timestamp):
+        if not is_reading(state):
+            return None
+
+        log_file = self.__file_for(state["chamber_id"])
+        log_file.write(pack(state, timestamp))
+        return log_file
+
+    def add(self, state, timestamp=None):
+        """Appends one reading sampled at `timestamp` (epoch seconds, default now)"""
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self.__lock:
+            log_file = self.__write(state, timestamp)
+            if log_file is not None:
+                log_file.flush()
+
+    def write_cycle(self, states, timestamp=None):
+        """Appends a chamber_id => state dict from one collection cycle"""
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self.__lock:
+            for state in states.values():
+                self.__write(state, timestamp)
+            self.__flush()
+
+    def flush(self):
+        with self.__lock:
+            self.__flush()
+
+    def __flush(self):
+        for log_file in self.__files.values():
+            log_file.flush()
+
+    def close(self):
+        with self.__lock:
+            for log_file in self.__files.values():
+                log_file.close()
+            self.__files.clear()
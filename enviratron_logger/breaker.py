@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+breaker_logger = logging.getLogger("enviratron_breaker")
+
+# Defaults, all of which can be overridden with the circuit_breaker section of the yaml config:
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_BASE_BACKOFF = 30.0
+DEFAULT_MAX_BACKOFF = 3600.0
+# Where save_breakers() keeps the breaker states between one-shot (cron) runs, in the log directory:
+STATE_FILE_NAME = ".circuit_breakers.json"
+
+
+class CircuitBreaker:
+    """Tracks consecutive failures for one chamber controller
+
+    After `failure_threshold` failures in a row the breaker opens and requests to the controller
+    are refused. While open, a single probe request is let through after a backoff that doubles
+    with every failed probe (up to `max_backoff`). A successful probe closes the breaker again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        base_backoff=DEFAULT_BASE_BACKOFF,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.__clock = clock
+        self.__lock = threading.Lock()
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = base_backoff
+        self.next_probe = 0.0
+
+    def __transition(self, new_state):
+        if new_state != self.state:
+            breaker_logger.warning(
+                "circuit breaker for %s: %s -> %s (failures=%s, backoff=%ss)",
+                self.name,
+                self.state,
+                new_state,
+                self.failures,
+                self.backoff,
+            )
+            self.state = new_state
+
+    def allow_request(self):
+        """Returns True if the controller should be contacted now"""
+
+        with self.__lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and self.__clock() >= self.next_probe:
+                # Let exactly one probe through:
+                self.__transition(self.HALF_OPEN)
+                return True
+
+            return False
+
+    def record_success(self):
+        with self.__lock:
+            self.failures = 0
+            self.backoff = self.base_backoff
+            self.__transition(self.CLOSED)
+
+    def record_failure(self):
+        with self.__lock:
+            self.failures += 1
+
+            if self.state == self.HALF_OPEN:
+                # The probe failed, so wait twice as long before the next one:
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+            elif self.failures < self.failure_threshold:
+                return
+
+            self.next_probe = self.__clock() + self.backoff
+            self.__transition(self.OPEN)
+
+    def to_dict(self):
+        """The breaker's state, with the next probe as epoch seconds so another process can use it"""
+
+        with self.__lock:
+            return {
+                # A probe that was let through but never reported counts as failed:
+                "state": self.CLOSED if self.state == self.CLOSED else self.OPEN,
+                "failures": self.failures,
+                "backoff": self.backoff,
+                "next_probe": time.time() + (self.next_probe - self.__clock()),
+            }
+
+    def restore(self, saved):
+        """Picks up where a to_dict() (e.g. from an earlier run) left off"""
+
+        with self.__lock:
+            self.state = saved["state"]
+            self.failures = saved["failures"]
+            self.backoff = saved["backoff"]
+            self.next_probe = self.__clock() + (saved["next_probe"] - time.time())
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(chamber_id, **settings):
+    """Returns the process-wide circuit breaker for a chamber, creating it on first use"""
+
+    with _breakers_lock:
+        breaker = _breakers.get(chamber_id)
+
+        if breaker is None:
+            breaker = CircuitBreaker(f"chamber {chamber_id}", **settings)
+            _breakers[chamber_id] = breaker
+
+        return breaker
+
+
+def load_breakers(path, breakers):
+    """Restores a chamber_id => CircuitBreaker dict from a file written by save_breakers()
+
+    A missing or unreadable file leaves the breakers as they are.
+    """
+
+    try:
+        with open(path, "r") as state_file:
+            saved = json.load(state_file)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        breaker_logger.warning("ignoring circuit breaker state in %s: %s", path, e)
+        return
+
+    for chamber_id, breaker in breakers.items():
+        state = saved.get(str(chamber_id))
+        if state is not None:
+            breaker.restore(state)
+
+
+def save_breakers(path, breakers):
+    """Writes the state of a chamber_id => CircuitBreaker dict, so the next run can load_breakers()
+
+    Without it, a one-shot run every minute would start with every breaker closed and wait out the
+    timeout of every unreachable controller each time.
+    """
+
+    path = Path(path)
+    part = path.with_name(path.name + ".part")
+
+    with open(part, "w") as state_file:
+        json.dump({str(chamber_id): b.to_dict() for chamber_id, b in breakers.items()}, state_file)
+
+    os.replace(part, path)
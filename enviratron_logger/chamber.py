@@ -34,6 +34,11 @@ Number	Name	xml Tag	    Units	xml Tag	    Operating Range	xml Tags	Sensor Range
 """
 
 import requests
+import threading
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlencode
+from coalescer import ReadCoalescer
+from ratelimit import ControllerLimiter
 from collections import OrderedDict
 from lxml import etree
 from datetime import datetime
@@ -220,12 +225,114 @@ def tag_mapper(tag_str):
 
 
 
+def _percent_to_int(text):
+    # Dimmer levels look like "100 %":
+    return int(text.rstrip(" %"))
+
+
+def _on_off_to_bool(text):
+    return text == 'On'
+
+
+def _to_value(text):
+    # Readings look like "26.0 C", but some tags hold Yes/No flags or plain strings (e.g. the mode):
+    try:
+        return float(text.split(" ")[0])
+    except ValueError:
+
+        if text == 'No':
+            return False
+        elif text == 'Yes':
+            return True
+        else:
+            return text
+
+
+def _converter_for(tag):
+    ''' Picks the value converter for a Percival tag based on its suffix. '''
+
+    if tag.endswith('_Dim'):
+        return _percent_to_int
+    elif tag.endswith('_On_Off'):
+        return _on_off_to_bool
+    else:
+        return _to_value
+
+
+
+class _ReadPlan:
+    ''' A read of one tag set from one controller, compiled once: the deduplicated tags, the
+    ready-to-send read_data.xml URL and the set of keys the parsed response is cut down to. '''
+
+    __slots__ = ('tags', 'url', 'keys')
+
+    def __init__(self, tags, url):
+        self.tags = tags
+        self.url = url
+        self.keys = frozenset(tags)
+
+
+
+def _subset_response(resp_dict, wanted):
+    ''' Cuts the response to a merged read down to the keys one caller asked for (a set), shaped
+    the way __parse_percival_response() would have returned them to that caller alone. '''
+
+    subset = {}
+    last_key = None
+
+    for key, val in resp_dict.items():
+        if key not in wanted:
+            continue
+
+        subset[key] = val
+        last_key = key
+
+        if len(subset) == 1:
+            subset['chamber_id'] = resp_dict['chamber_id']
+            subset['env_var'] = None
+            subset['env_val'] = None
+
+    if last_key is not None:
+        subset['env_var'] = last_key.split("_")[0]
+        subset['env_val'] = subset[last_key]
+
+    return subset
+
+
+
 class GrowthChamberControl:
     TIMEOUT = 3.0
     SUPERVISOR_RPC_URL = 'http://localhost:9001/RPC2'
+    # Connection pool sizes for the keep-alive session held for each controller:
+    POOL_CONNECTIONS = 1
+    POOL_MAXSIZE = 4
     __level_multiplier = 1000
 
-    __growth_chamber_base_url = 'http://env-gc-{}.agron.iastate.edu/read_data.xml'
+    # One keep-alive session per chamber, shared by every instance for that chamber:
+    __sessions = {}
+    __sessions_lock = threading.Lock()
+
+    # Concurrent reads of the same controller are merged into as few requests as possible, see
+    # coalescer.py. One ReadCoalescer per controller URL:
+    COALESCE_READS = True
+    __coalescers = {}
+    __coalescers_lock = threading.Lock()
+
+    # With rate limiting on, every request to a controller goes through its ControllerLimiter (see
+    # ratelimit.py), so that no script can flood it. Settings for the limiters, None (the default)
+    # sends requests straight away, see configure_limits():
+    RATE_LIMIT = None
+    __limiters = {}
+    __limiters_lock = threading.Lock()
+
+    # Compiled _ReadPlans keyed by (base_url, tags tuple), see __get_read_plan(). The polling loop
+    # only ever reads a handful of tag sets, the cache is emptied if scripts push it past this size:
+    READ_PLAN_CACHE_SIZE = 1024
+    __read_plans = {}
+
+    # Where the controllers live, {} is replaced with the chamber id. Can be overridden per instance,
+    # e.g. to point at the local emulator (see emulator.py):
+    BASE_URL = 'http://env-gc-{}.agron.iastate.edu'
 
     __tag_map = {
         # SENSOR READINGS:
@@ -277,10 +384,104 @@ class GrowthChamberControl:
     # The reverse of the above key=>value mapping:
     __rev_tag_map = {v:k for k,v in __tag_map.items()}
 
+    # Percival tag => (our key, value converter, env_var) decoder table, built once from __tag_map:
+    __decoders = {
+        tag: (key, _converter_for(tag), key.split("_")[0])
+        for tag, key in __tag_map.items()
+    }
 
-    def __init__(self, chamber_id):
+
+    def __init__(self, chamber_id, base_url=None):
 
         self.chamber_id = chamber_id
+        self.base_url = (base_url or self.BASE_URL).format(chamber_id)
+        self.__session = self.__get_session(chamber_id)
+        self.__coalescer = self.__get_coalescer(self.base_url)
+        self.__limiter = self.__get_limiter(self.base_url)
+
+
+    @classmethod
+    def __get_session(cls, chamber_id):
+        ''' Returns the pooled requests session for a chamber, creating it on first use so that the
+        TCP connection (and DNS lookup) is reused across reads and writes. '''
+
+        with cls.__sessions_lock:
+            session = cls.__sessions.get(chamber_id)
+
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=cls.POOL_CONNECTIONS,
+                    pool_maxsize=cls.POOL_MAXSIZE
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                cls.__sessions[chamber_id] = session
+
+        return session
+
+
+    @classmethod
+    def __get_coalescer(cls, base_url):
+        ''' Returns the read coalescer shared by every instance talking to the same controller. '''
+
+        with cls.__coalescers_lock:
+            coalescer = cls.__coalescers.get(base_url)
+
+            if coalescer is None:
+                coalescer = cls.__coalescers[base_url] = ReadCoalescer()
+
+        return coalescer
+
+
+    @classmethod
+    def __get_limiter(cls, base_url):
+        ''' Returns the rate limiter shared by every instance talking to the same controller, or
+        None when rate limiting is off. '''
+
+        with cls.__limiters_lock:
+            if cls.RATE_LIMIT is None:
+                return None
+
+            limiter = cls.__limiters.get(base_url)
+
+            if limiter is None:
+                limiter = ControllerLimiter(base_url, **cls.RATE_LIMIT)
+                cls.__limiters[base_url] = limiter
+
+        return limiter
+
+
+    @classmethod
+    def configure_limits(cls, **settings):
+        ''' Turns rate limiting on for instances created from now on, with the given rate, burst,
+        max_in_flight and max_wait of the per-controller limiters (see ratelimit.ControllerLimiter).
+        Settings that aren't given keep the ratelimit.py defaults. '''
+
+        with cls.__limiters_lock:
+            cls.RATE_LIMIT = dict(settings)
+            cls.__limiters.clear()
+
+
+    def __get(self, url, **kwargs):
+        ''' Every request to the controller goes through here, queueing behind its limiter if
+        rate limiting is on. '''
+
+        if self.__limiter is None:
+            return self.__session.get(url, **kwargs)
+
+        with self.__limiter:
+            return self.__session.get(url, **kwargs)
+
+
+    @classmethod
+    def close_sessions(cls):
+        ''' Closes every pooled controller session, e.g. on shutdown. '''
+
+        with cls.__sessions_lock:
+            for session in cls.__sessions.values():
+                session.close()
+            cls.__sessions.clear()
 
 
     def __tag_mapper(self, tag_str):
@@ -292,65 +493,72 @@ class GrowthChamberControl:
 
 
     def __get_base_url(self):
-        return self.__growth_chamber_base_url.format(self.chamber_id)
-
+        return self.base_url + '/read_data.xml'
 
-    def __parse_percival_response(self, resp_str):
 
-        resp_dict = {}
-        r_xml = etree.fromstring(resp_str)
-        context = etree.iterwalk(r_xml, events=("start",))
+    def __get_read_plan(self, tags_list):
+        ''' Returns the compiled _ReadPlan for reading tags_list from this controller, so the URL is
+        only built and encoded the first time a tag set is read. '''
 
+        key = (self.base_url, tuple(tags_list))
+        plan = self.__read_plans.get(key)
 
-        for action, elem in context:
+        if plan is None:
+            tags = tuple(dict.fromkeys(tags_list))
+            # Tags we have no Percival name for are left out, as requests drops None params:
+            percival_tags = [self.__rev_tag_map.get(tag) for tag in tags]
+            query = urlencode(
+                [('Cmd', 'read')] + [('Tag', tag) for tag in percival_tags if tag is not None]
+            )
+            plan = _ReadPlan(tags, self.__get_base_url() + '?' + query)
 
-            if elem.tag == 'Req':
-                continue
+            # Plans are immutable, a race only means one gets compiled twice:
+            if len(self.__read_plans) >= self.READ_PLAN_CACHE_SIZE:
+                self.__read_plans.clear()
+            self.__read_plans[key] = plan
 
-            if elem.tag.endswith('_Dim'):
-                val = int(elem.text.rstrip(" %"))
+        return plan
 
-            elif elem.tag.endswith('_On_Off'):
 
-                if elem.text == 'On':
-                    val = True
-                else:
-                    val = False
+    def __parse_percival_response(self, resp_bytes):
+        ''' Parses a read_data.xml response (bytes, straight off the socket) into a dict keyed by our
+        local variable names, using the precompiled __decoders table. '''
 
+        resp_dict = {}
+        decoders = self.__decoders
+        env_var = None
+        val = None
+
+        for elem in etree.fromstring(resp_bytes).iter():
+            tag = elem.tag
+            decoder = decoders.get(tag)
+
+            if decoder is None:
+                if tag == 'Req':
+                    continue
+                # A tag we don't know about, decode it by its suffix like any other:
+                decoder = (None, _converter_for(tag), None)
+
+            key, convert, tag_env_var = decoder
+            val = convert(elem.text)
+            resp_dict[key] = val
+
+            if tag_env_var is not None:
+                env_var = tag_env_var
+
+            if len(resp_dict) == 1:
+                # We are adding the chamber ID to the response from the chamber so that we have access to it
+                # in the django_celery_results app which does not store args or kwargs, only response vals.
+                # The placeholders keep the same key order as the responses have always had:
+                resp_dict['chamber_id'] = self.chamber_id
+                resp_dict['env_var'] = None
+                resp_dict['env_val'] = None
+
+        if resp_dict:
+            if env_var is None:
+                del resp_dict['env_var']
             else:
-
-                try:
-
-                    val = float(elem.text.split(" ")[0])
-                except ValueError:
-
-                    if elem.text == 'No':
-                        val = False
-                    elif elem.text == 'Yes':
-                        val = True
-                    else:
-                        val = elem.text
-
-            '''
-            print(elem)
-            print(elem.tag)
-            print(elem.text)
-            print(val)
-            print("-----------------------")
-            '''
-            resp_dict[self.__tag_mapper(elem.tag)] = val
-
-            # We are adding the chamber ID to the response from the chamber so that we have access to it
-            # in the django_celery_results app which does not store args or kwargs, only response vals:
-            resp_dict['chamber_id'] = self.chamber_id
-
-            try:
-                resp_dict['env_var'] = self.__tag_mapper(elem.tag).split("_")[0]
-            except AttributeError:
-
-                print(elem)
-                print(elem.tag)
-
+                resp_dict['env_var'] = env_var
 
             resp_dict['env_val'] = val
 
@@ -411,7 +619,7 @@ class GrowthChamberControl:
         #print(payload)
         #print("----------------")
 
-        r = requests.get(
+        r = self.__get(
             self.__get_base_url()
             , params=payload
         )
@@ -419,24 +627,36 @@ class GrowthChamberControl:
         #print('WHAT IS RESPONSE TEXT?')
         #print(r.text)
 
-        return self.__parse_percival_response(r.text)
+        return self.__parse_percival_response(r.content)
 
 
     def __get_chamber_values(self, tags_list):
+        ''' Reads tags_list from the controller, sharing the request with any concurrent reads of
+        the same controller. Each caller gets back just the values it asked for. '''
 
-        payload = {
-            'Cmd': 'read',
-            'Tag': [self.__rev_tag_map.get(tag) for tag in tags_list]
-        }
+        plan = self.__get_read_plan(tags_list)
+
+        if not self.COALESCE_READS:
+            return self.__request_chamber_values(plan.tags)
+
+        resp_dict, request_tags = self.__coalescer.read(plan.tags, self.__request_chamber_values)
+
+        # Error responses, and responses to exactly what was asked for, are passed on as they are.
+        # The request's tags always include ours, so the same number means the same tags:
+        if 'type' in resp_dict or len(request_tags) == len(plan.tags):
+            return dict(resp_dict)
+
+        return _subset_response(resp_dict, plan.keys)
+
+
+    def __request_chamber_values(self, tags_list):
+
+        plan = self.__get_read_plan(tags_list)
 
         try:
-            r = requests.get(
-                self.__get_base_url(),
-                params=payload,
-                timeout=self.TIMEOUT
-            )
+            r = self.__get(plan.url, timeout=self.TIMEOUT)
 
-            return self.__parse_percival_response(r.text)
+            return self.__parse_percival_response(r.content)
         except requests.exceptions.ConnectTimeout:
             return {"type": "ConnectionError"}
 
@@ -638,18 +858,34 @@ class GrowthChamberControl:
         return self.__get_chamber_values(tags)
 
 
+    # Everything get_state() reads, in the order the values are logged:
+    STATE_TAGS = (
+        'co2_actual', 'co2_target', 'humidity_actual', 'humidity_target',
+        'humidification_enabled', 'dehumidification_enabled',
+        #'lighting_1_on', 'lighting_1', 'lighting_2_on', 'lighting_2',
+        'lighting_1', 'lighting_2', 'lighting_3', 'lighting_4', 'lighting_5', 'lighting_6', 'lighting_7'
+        , 'temperature_actual', 'temperature_target'
+        , 'air_diverter_state', 'watering_actual', 'watering_target'
+        , 'door_state', 'curtain_state', 'operating_mode',
+    )
+
+    # The part of the state that changes from one reading to the next: sensor readings and the
+    # door, curtain and diverter. Targets, lighting levels, the humidity enable flags and the
+    # operating mode rarely change (see tiers.py):
+    FAST_STATE_TAGS = (
+        'co2_actual', 'humidity_actual', 'temperature_actual'
+        , 'air_diverter_state', 'watering_actual'
+        , 'door_state', 'curtain_state',
+    )
+
+
     def get_state(self):
-        tags = [
-            'co2_actual', 'co2_target', 'co2_actual', 'co2_target', 'humidity_actual', 'humidity_target',
-            'humidification_enabled', 'dehumidification_enabled',
-            #'lighting_1_on', 'lighting_1', 'lighting_2_on', 'lighting_2',
-            'lighting_1', 'lighting_2', 'lighting_3', 'lighting_4', 'lighting_5', 'lighting_6', 'lighting_7'
-            , 'temperature_actual', 'temperature_target'
-            , 'air_diverter_state', 'watering_actual', 'watering_target'
-            , 'door_state', 'curtain_state', 'operating_mode',
-        ]
+        return self.__get_chamber_values(list(self.STATE_TAGS))
 
-        return self.__get_chamber_values(tags)
+
+    def get_fast_state(self):
+        ''' Reads just the FAST_STATE_TAGS, a much smaller request than get_state(). '''
+        return self.__get_chamber_values(list(self.FAST_STATE_TAGS))
 
 
     def get_time(self):
@@ -711,8 +947,8 @@ class GrowthChamberControl:
         ''' To set mode, we call a different url (ramping.xml vs read_data.xml), so we are not using
         self.__get_base_url() here '''
 
-        r = requests.get(
-            'http://env-gc-{}.agron.iastate.edu/ramping.xml'.format(self.chamber_id),
+        r = self.__get(
+            self.base_url + '/ramping.xml',
             params=payload,
             timeout=self.TIMEOUT
         )
@@ -0,0 +1,94 @@
+"""
+Single-flight coalescing of concurrent controller reads
+
+Each controller gets a ReadCoalescer. A read that arrives while another one is in flight joins the
+next request, which is sent as soon as the current one completes and asks for the union of every
+tag that was queued for it. It never shares the request already in flight, even when that one asks
+for the same tags: it may have been sent before the caller's own call started (e.g. before a write
+the caller just made), so its response could be stale. So however many callers read a chamber at
+once, at most one request is in flight and one is waiting, and a burst of reads costs at most two
+requests.
+"""
+
+import threading
+
+
+class _Flight:
+    """One request and everyone waiting on its result"""
+
+    def __init__(self, tags):
+        self.tags = list(dict.fromkeys(tags))
+        self.tag_set = set(self.tags)
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def add(self, tags):
+        for tag in tags:
+            if tag not in self.tag_set:
+                self.tags.append(tag)
+                self.tag_set.add(tag)
+
+
+class ReadCoalescer:
+    """Merges concurrent reads of one controller into as few requests as possible"""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__in_flight = None
+        self.__next = None
+        # Counters, e.g. for benchmarks: requests actually sent vs reads served
+        self.requests = 0
+        self.reads = 0
+
+    def read(self, tags, fetch):
+        """Returns (result, tags) of the request that served a read of `tags`
+
+        `fetch(tags)` sends a request and returns its result; it's called by whichever caller ends
+        up leading a request, with the union of the tags of everyone sharing it. The returned tags
+        tell the caller what the shared result covers (it may hold more than it asked for).
+        Exceptions raised by fetch are raised in every caller sharing the request.
+        """
+
+        with self.__lock:
+            self.reads += 1
+            in_flight = self.__in_flight
+
+            if in_flight is None:
+                flight = self.__in_flight = _Flight(tags)
+                leader, wait_for = True, None
+            elif self.__next is None:
+                flight = self.__next = _Flight(tags)
+                leader, wait_for = True, in_flight
+            else:
+                flight = self.__next
+                flight.add(tags)
+                leader, wait_for = False, None
+
+        if leader:
+            if wait_for is not None:
+                # Sent once the request in flight completes, which makes this one the one in flight:
+                wait_for.done.wait()
+            self.__send(flight, fetch)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+
+        return flight.result, flight.tags
+
+    def __send(self, flight, fetch):
+        with self.__lock:
+            self.requests += 1
+
+        try:
+            flight.result = fetch(flight.tags)
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self.__lock:
+                # The queued request (if any) goes next, no more tags can join it from here on:
+                self.__in_flight = self.__next
+                self.__next = None
+            flight.done.set()
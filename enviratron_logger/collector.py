@@ -0,0 +1,107 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from chamber import GrowthChamberControl as gcc
+from records import is_reading
+
+# Upper bound on the number of chamber controllers being read at the same time:
+DEFAULT_MAX_CONCURRENCY = 8
+# Number of times a chamber read is tried within one cycle before an error record is logged:
+DEFAULT_ATTEMPTS = 1
+
+
+def error_record(chamber_id, error_type, error="", elapsed=0.0, attempts=0):
+    """Builds the record that is logged in place of a reading when a chamber can't be read"""
+    return {
+        "type": error_type,
+        "chamber_id": chamber_id,
+        "error": error,
+        "elapsed": round(elapsed, 3),
+        "attempts": attempts,
+    }
+
+
+def read_state(chamber, breaker=None, attempts=DEFAULT_ATTEMPTS):
+    """Reads a chamber's state, always returning either a reading or an error record
+
+    Nothing raised while talking to (or parsing the response of) one controller is allowed to
+    escape, so a single misbehaving chamber can't cost us the readings from the rest of the fleet.
+    The read is tried up to `attempts` times, and the circuit breaker (if given) is honored and
+    updated with the outcome.
+    """
+
+    if breaker is not None and not breaker.allow_request():
+        # The controller has been unreachable, don't spend the timeout on it this time around:
+        return error_record(chamber.chamber_id, "CircuitOpen")
+
+    start = time.monotonic()
+
+    for attempt in range(1, max(1, attempts) + 1):
+        try:
+            state = chamber.get_state()
+        except Exception as e:
+            error_type, error = type(e).__name__, str(e)
+        else:
+            if is_reading(state):
+                if breaker is not None:
+                    breaker.record_success()
+                return state
+
+            error_type, error = state["type"], state.get("error", "")
+
+    if breaker is not None:
+        breaker.record_failure()
+
+    return error_record(
+        chamber.chamber_id, error_type, error, time.monotonic() - start, attempt
+    )
+
+
+async def _collect_state(chamber_id, loop, executor, breakers, attempts):
+    """Reads a single chamber's state on the executor so that the event loop is never blocked"""
+    chamber = gcc(chamber_id)
+    read = partial(read_state, chamber, breakers.get(chamber_id), attempts)
+    state = await loop.run_in_executor(executor, read)
+    return chamber_id, state
+
+
+async def collect_states(
+    chamber_ids, max_concurrency=DEFAULT_MAX_CONCURRENCY, breakers=None, attempts=DEFAULT_ATTEMPTS
+):
+    """Reads the state of every chamber concurrently and returns a chamber_id => state dict
+
+    GrowthChamberControl is a blocking, requests based API, so each read is handed off to a worker
+    thread. The size of the worker pool caps how many controllers are hit at once, and the total
+    time for a cycle is roughly that of the slowest controller rather than the sum of all of them.
+    `breakers` is an optional chamber_id => CircuitBreaker dict. Every chamber gets either a
+    reading or an error record, see read_state().
+    """
+
+    loop = asyncio.get_running_loop()
+    breakers = breakers or {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        results = await asyncio.gather(
+            *(
+                _collect_state(chamber_id, loop, executor, breakers, attempts)
+                for chamber_id in chamber_ids
+            )
+        )
+
+    # gather() preserves the order of chamber_ids, so the logs are written in config order:
+    return dict(results)
+
+
+def collect(
+    chamber_ids, max_concurrency=DEFAULT_MAX_CONCURRENCY, breakers=None, attempts=DEFAULT_ATTEMPTS
+):
+    """Synchronous convenience wrapper around collect_states()"""
+    return asyncio.run(
+        collect_states(
+            chamber_ids,
+            max_concurrency=max_concurrency,
+            breakers=breakers,
+            attempts=attempts,
+        )
+    )
@@ -0,0 +1,126 @@
+"""
+Change-only ("deadband") logging
+
+Most of a reading is the same minute after minute, so instead of logging the full state every
+time, a DeltaEncoder writes a full keyframe every `keyframe_interval` seconds and in between only
+the fields that moved by more than their deadband since they were last written:
+
+    {"timestamp": "...", "level": "INFO", "delta": true, "chamber_id": 1, "co2_actual": 455.0}
+
+rebuild() turns such a stream back into full records, see history.py.
+"""
+
+import logging
+import threading
+
+from records import LIGHTING_KEYS, NOT_LOGGED_KEYS, is_reading
+
+# Seconds between full keyframe records:
+DEFAULT_KEYFRAME_INTERVAL = 600.0
+# The key that marks a record as a delta:
+DELTA_KEY = "delta"
+# Always written, so every delta still says which chamber it belongs to:
+ALWAYS_WRITTEN = ("chamber_id",)
+# Not logged at all, see records.as_logged():
+NEVER_WRITTEN = NOT_LOGGED_KEYS
+
+
+class DeltaEncoder:
+    """Turns consecutive readings of one chamber into keyframes and deltas
+
+    `deadbands` maps field names to the smallest change worth writing; numeric fields without one
+    are written on any change, other fields whenever they differ.
+    """
+
+    def __init__(self, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, deadbands=None):
+        self.keyframe_interval = keyframe_interval
+        self.deadbands = deadbands or {}
+        # The values as last written, i.e. what a reader rebuilding the stream currently has:
+        self.__written = None
+        self.__last_keyframe = None
+        self.__lock = threading.Lock()
+
+    def __changed(self, key, old, new):
+        if type(old) in (int, float) and type(new) in (int, float):
+            return abs(new - old) > self.deadbands.get(key, 0)
+        return old != new
+
+    def encode(self, state, now):
+        """Returns what should be logged for `state` sampled at `now` (epoch seconds)"""
+
+        if not is_reading(state):
+            return state
+
+        with self.__lock:
+            written = self.__written
+
+            if (
+                written is None
+                or now - self.__last_keyframe >= self.keyframe_interval
+                or written.keys() != state.keys()
+            ):
+                self.__written = dict(state)
+                self.__last_keyframe = now
+                return state
+
+            delta = {DELTA_KEY: True}
+            lighting_changed = False
+
+            for key, value in state.items():
+                if key in ALWAYS_WRITTEN:
+                    delta[key] = value
+                elif key in NEVER_WRITTEN:
+                    continue
+                elif self.__changed(key, written[key], value):
+                    # set_lighting() sets every channel at once, so they are written as a group:
+                    if key in LIGHTING_KEYS:
+                        lighting_changed = True
+                    else:
+                        delta[key] = value
+                        written[key] = value
+
+            if lighting_changed:
+                for key in LIGHTING_KEYS:
+                    if key in state:
+                        delta[key] = state[key]
+                        written[key] = state[key]
+
+            return delta
+
+
+class DeltaFilter(logging.Filter):
+    """Rewrites readings logged through a chamber's logger into keyframes and deltas"""
+
+    def __init__(self, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, deadbands=None):
+        super(DeltaFilter, self).__init__()
+        self.encoder = DeltaEncoder(keyframe_interval=keyframe_interval, deadbands=deadbands)
+
+    def filter(self, record):
+        record.msg = self.encoder.encode(record.msg, record.created)
+        return True
+
+
+def rebuild(records):
+    """Turns a stream of logged keyframes, deltas and error records back into full records
+
+    Deltas seen before the first keyframe (e.g. when the older segments were deleted) can't be
+    completed and are skipped.
+    """
+
+    state = None
+
+    for record in records:
+        if record.get(DELTA_KEY) is True:
+            if state is None:
+                continue
+
+            state.update(record)
+            del state[DELTA_KEY]
+            yield dict(state)
+
+        elif not is_reading(record):
+            yield record
+
+        else:
+            state = dict(record)
+            yield record
@@ -0,0 +1,336 @@
+"""
+A local stand-in for the Percival growth chamber controllers
+
+Serves the same read_data.xml (Cmd=read / Cmd=write) and ramping.xml (Cmd=run) protocol that
+GrowthChamberControl speaks, for any number of virtual chambers, at
+
+    http://<host>:<port>/<chamber_id>/read_data.xml
+
+Point the logger at it with `base_url: http://127.0.0.1:8080/{}` in the yaml config. Response
+latency, hung requests, malformed responses and slowly drifting sensor values are all configurable,
+so the logger can be tested and load tested without touching the real controllers. The clock tags
+(Real_Time_Hour/Minute/Second) follow the local wall clock until they are written:
+
+    python emulator.py --port 8080 --latency 0.05 --jitter 0.5 --timeout-rate 0.01
+"""
+
+import argparse
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from xml.sax.saxutils import escape
+
+# The values a freshly powered up virtual chamber reports:
+DEFAULT_TAGS = {
+    'PV_1': 26.0, 'CM_SP_1_Manual': 26.0,
+    'PV_2': 72.0, 'CM_SP_2_Manual': 74.0,
+    'PV_3': 502.0, 'CM_SP_3_Manual': 500.0,
+    'PV_4': 850.0,
+    'PV_5': 98.0, 'CM_SP_5_Manual': 0.0,
+    'EO_1_Dim': 10000, 'EO_2_Dim': 10000, 'EO_3_Dim': 10000, 'EO_4_Dim': 10000,
+    'EO_5_Dim': 10000, 'EO_6_Dim': 10000, 'EO_7_Dim': 10000,
+    'EO_1_On_Off': 'On', 'EO_2_On_Off': 'On',
+    'EO_13_On_Off': 'Off', 'EO_14_On_Off': 'Off', 'EO_15_On_Off': 'Off',
+    'CLC_Enable_Rh_1': 'Yes', 'CLC_Enable_Rh_2': 'Yes',
+    'CM_NON_RAMPING_MODE': 'Manual',
+}
+
+# Process value => set point tag, the process values drift towards their set points:
+DRIFTING_TAGS = {
+    'PV_1': 'CM_SP_1_Manual',
+    'PV_2': 'CM_SP_2_Manual',
+    'PV_3': 'CM_SP_3_Manual',
+    'PV_4': None,
+    'PV_5': 'CM_SP_5_Manual',
+}
+
+UNITS = {'PV_1': 'C', 'PV_2': '%RH', 'PV_3': 'PPM', 'PV_4': 'UML', 'PV_5': '%WC',
+         'CM_SP_1_Manual': 'C', 'CM_SP_2_Manual': '%RH', 'CM_SP_3_Manual': 'PPM',
+         'CM_SP_5_Manual': '%WC'}
+
+# The controller's clock, read from (and set relative to) the emulator's wall clock:
+CLOCK_TAGS = ('Real_Time_Hour', 'Real_Time_Minute', 'Real_Time_Second')
+
+MODES = {
+    'nr_manual': 'Manual',
+    'ramping_manual': 'Ramping Manual',
+    'nr_diurnal': 'Diurnal',
+    'ramping_daily_light_integral': 'DLI',
+}
+
+
+class EmulatorSettings:
+    """Fault and timing knobs shared by every virtual chamber"""
+
+    def __init__(self, latency=0.0, jitter=0.0, timeout_rate=0.0, hang=10.0,
+                 malformed_rate=0.0, drift=0.05, noise=0.2, seed=None):
+        # Median response latency in seconds, and the sigma of the lognormal spread around it:
+        self.latency = latency
+        self.jitter = jitter
+        # Fraction of requests that hang for `hang` seconds, long enough to trip the client timeout:
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+        # Fraction of requests answered with truncated, unparseable XML:
+        self.malformed_rate = malformed_rate
+        # Fraction of the distance to the set point covered per second, and random walk noise:
+        self.drift = drift
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample_latency(self):
+        if self.latency <= 0:
+            return 0.0
+
+        with self.lock:
+            if self.jitter <= 0:
+                return self.latency
+            return self.random.lognormvariate(math.log(self.latency), self.jitter)
+
+    def roll(self, rate):
+        if rate <= 0:
+            return False
+
+        with self.lock:
+            return self.random.random() < rate
+
+
+class VirtualChamber:
+    """The tag values of one emulated controller"""
+
+    def __init__(self, chamber_id, settings):
+        self.chamber_id = chamber_id
+        self.settings = settings
+        self.tags = dict(DEFAULT_TAGS)
+        # Seconds the chamber's clock is ahead of the wall clock, changed by writing the clock tags:
+        self.clock_offset = 0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __drift(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        pull = min(1.0, self.settings.drift * elapsed)
+
+        for tag, target_tag in DRIFTING_TAGS.items():
+            value = self.tags[tag]
+
+            if target_tag is not None:
+                value += (self.tags[target_tag] - value) * pull
+
+            with self.settings.lock:
+                value += self.settings.random.gauss(0, self.settings.noise * math.sqrt(elapsed))
+
+            self.tags[tag] = value
+
+    def __clock(self):
+        now = time.localtime()
+        seconds = (now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec + self.clock_offset) % 86400
+        return dict(zip(CLOCK_TAGS, (seconds // 3600, seconds // 60 % 60, seconds % 60)))
+
+    def read(self, tags):
+        with self.lock:
+            self.__drift()
+            clock = self.__clock()
+            return [(tag, clock[tag] if tag in clock else self.tags.get(tag)) for tag in tags]
+
+    def write(self, params):
+        written = []
+
+        with self.lock:
+            before = self.__clock()
+            clock = dict(before)
+
+            for tag, value in params:
+                if tag in UNITS:
+                    # Set points are written scaled up by GrowthChamberControl's level multiplier:
+                    value = float(value) / 1000
+                elif tag.endswith('_Dim'):
+                    value = int(float(value))
+                elif tag in CLOCK_TAGS:
+                    value = int(value)
+                    clock[tag] = value
+                    written.append((tag, value))
+                    continue
+
+                self.tags[tag] = value
+                written.append((tag, value))
+
+            # Setting the clock moves it by the difference, from then on it keeps ticking:
+            self.clock_offset += sum(
+                (clock[tag] - before[tag]) * unit for tag, unit in zip(CLOCK_TAGS, (3600, 60, 1))
+            )
+
+        return written
+
+    def run(self, item):
+        with self.lock:
+            self.tags['CM_NON_RAMPING_MODE'] = MODES.get(item, item)
+            return self.tags['CM_NON_RAMPING_MODE']
+
+
+def format_value(tag, value):
+    """Renders a tag value the way the Percival controller does"""
+
+    if value is None:
+        return ''
+    if tag.endswith('_Dim'):
+        return '{} %'.format(value)
+    if tag in UNITS:
+        return '{:.1f} {}'.format(value, UNITS[tag])
+
+    return str(value)
+
+
+def render(pairs):
+    body = ''.join(
+        '<{0}>{1}</{0}>'.format(tag, escape(format_value(tag, value))) for tag, value in pairs
+    )
+    return '<?xml version="1.0" encoding="UTF-8"?><Req>{}</Req>'.format(body).encode('utf-8')
+
+
+class PercivalRequestHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        # Keep load tests quiet
+        pass
+
+    def do_GET(self):
+        emulator = self.server.emulator
+        settings = emulator.settings
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+
+        if len(parts) != 2 or parts[1] not in ('read_data.xml', 'ramping.xml'):
+            self.send_error(404)
+            return
+
+        try:
+            chamber = emulator.chamber(int(parts[0]))
+        except ValueError:
+            self.send_error(404)
+            return
+
+        if settings.roll(settings.timeout_rate):
+            time.sleep(settings.hang)
+            return
+
+        delay = settings.sample_latency()
+        if delay:
+            time.sleep(delay)
+
+        params = parse_qsl(url.query, keep_blank_values=True)
+        cmd = next((v for k, v in params if k == 'Cmd'), None)
+        params = [(k, v) for k, v in params if k != 'Cmd']
+
+        if parts[1] == 'ramping.xml':
+            if cmd != 'run':
+                self.send_error(400)
+                return
+            item = next((v for k, v in params if k == 'Item'), '')
+            body = render([('CM_NON_RAMPING_MODE', chamber.run(item))])
+        elif cmd == 'read':
+            body = render(chamber.read([v for k, v in params if k == 'Tag']))
+        elif cmd == 'write':
+            body = render(chamber.write(params))
+        else:
+            self.send_error(400)
+            return
+
+        if settings.roll(settings.malformed_rate):
+            body = body[:len(body) // 2]
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class EmulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for a whole fleet's worth of simultaneous connections:
+    request_queue_size = 1024
+
+
+class PercivalEmulator:
+    """An HTTP server emulating any number of Percival controllers, on a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, settings=None):
+        self.settings = settings or EmulatorSettings()
+        self.__chambers = {}
+        self.__chambers_lock = threading.Lock()
+        self.server = EmulatorServer((host, port), PercivalRequestHandler)
+        self.server.emulator = self
+        self.__thread = None
+
+    @property
+    def base_url(self):
+        """The value to use for GrowthChamberControl's base_url"""
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}/{{}}'.format(host, port)
+
+    def chamber(self, chamber_id):
+        """Returns the virtual chamber for an id, powering it up on first use"""
+
+        with self.__chambers_lock:
+            chamber = self.__chambers.get(chamber_id)
+
+            if chamber is None:
+                chamber = VirtualChamber(chamber_id, self.settings)
+                self.__chambers[chamber_id] = chamber
+
+            return chamber
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Emulates Percival growth chamber controllers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='median response latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='lognormal sigma of the latency')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='fraction of requests that hang')
+    parser.add_argument('--hang', type=float, default=10.0, help='how long hung requests hang (s)')
+    parser.add_argument('--malformed-rate', type=float, default=0.0,
+                        help='fraction of responses with truncated XML')
+    parser.add_argument('--drift', type=float, default=0.05)
+    parser.add_argument('--noise', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    settings = EmulatorSettings(
+        latency=args.latency, jitter=args.jitter, timeout_rate=args.timeout_rate, hang=args.hang,
+        malformed_rate=args.malformed_rate, drift=args.drift, noise=args.noise, seed=args.seed,
+    )
+    emulator = PercivalEmulator(args.host, args.port, settings)
+    print('Emulating Percival controllers at base_url: {}'.format(emulator.base_url))
+
+    try:
+        emulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,38 @@
-import sys
+import argparse
 import logging
+import signal
+import threading
 from datetime import datetime
 from pathlib import Path
 import yaml
 from pythonjsonlogger import jsonlogger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from chamber import GrowthChamberControl as gcc
+from collector import collect, DEFAULT_ATTEMPTS, DEFAULT_MAX_CONCURRENCY
+import scheduler
+from breaker import STATE_FILE_NAME, get_breaker, load_breakers, save_breakers
+from log_writer import (
+    QueuedLogWriter,
+    QueuedSinkWriter,
+    DEFAULT_OVERFLOW,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_STATS_INTERVAL,
+)
+from rotation import RotatingChamberFileHandler
+from sqlite_sink import SQLiteSink
+from binary_log import BinarySink
+from aggregates import AggregateSink
+from state_api import LatestStates, StateAPI
+from deadband import DeltaFilter, DEFAULT_KEYFRAME_INTERVAL
+from tiers import DEFAULT_SLOW_INTERVAL
+from records import LIGHTING_KEYS, NOT_LOGGED_KEYS, as_logged, is_reading, scale_lighting
+
+sink_logger = logging.getLogger("enviratron_sinks")
+main_logger = logging.getLogger("enviratron_logger")
 
 
 class CustomJsonFormatter(jsonlogger.JsonFormatter):
@@ -12,7 +40,9 @@ class CustomJsonFormatter(jsonlogger.JsonFormatter):
 
     def add_fields(self, log_record, record, message_dict):
         super(CustomJsonFormatter, self).add_fields(log_record, record, message_dict)
-        now = datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        # Records may be formatted on the writer thread some time after they were logged, so the
+        # timestamp comes from the record rather than the clock:
+        now = datetime.fromtimestamp(record.created).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
         log_record["timestamp"] = now
 
         if log_record.get("level"):
@@ -24,64 +54,594 @@ class CustomJsonFormatter(jsonlogger.JsonFormatter):
     def process_log_record(self, log_record):
         del log_record["message"]
 
-        try:
-            del log_record["env_var"]
-            del log_record["env_val"]
-        except KeyError:
-            pass
+        # Drops env_var / env_val and changes Percival's 0-10,000 scale for lighting intensity to
+        # the more readable 0-100 scale:
+        return super(CustomJsonFormatter, self).process_log_record(as_logged(log_record))
 
-        try:
-            # change Percival's 0-10,000 scale for lighting intensity to the more readable 0-100 scale:
-            for i in range(1, 8):
-                log_record[f"lighting_{i}"] = log_record[f"lighting_{i}"] / 100
-        except KeyError:
-            pass
 
-        return super(CustomJsonFormatter, self).process_log_record(log_record)
+class FastJsonFormatter(CustomJsonFormatter):
+    """Writes the same bytes as CustomJsonFormatter, with a lot less work per record
+
+    python-json-logger copies every record into an OrderedDict, scans the LogRecord for extra
+    attributes and only then serializes. Readings always come with the same keys in the same
+    order, so for each distinct key order we precompute a plan: which keys to keep, which to
+    rescale, and a '{"timestamp": "%s", "level": "%s", "co2_actual": %s, ...}' template with the
+    keys already encoded. Formatting a record is then just picking out its values, encoding them
+    and filling in the template. The date/time part of the timestamp is only rebuilt once a second.
+
+    When orjson is installed the values are encoded with it, otherwise (and for any record whose
+    values orjson would encode differently than json.dumps, e.g. NaN, 1e-05 or a non-ASCII
+    string) the whole record goes through the stdlib encoder. Records that aren't readings at all
+    (string messages, exceptions) go through the regular formatter.
+    """
+
+    SKIPPED_KEYS = frozenset(NOT_LOGGED_KEYS)
+    # Upper bound on the number of distinct key orders we keep plans for:
+    MAX_PLANS = 64
+
+    def __init__(self, *args, **kwargs):
+        super(FastJsonFormatter, self).__init__(*args, **kwargs)
+        # (epoch second, "%Y-%m-%dT%H:%M:%S." string) for the most recent record:
+        self.__timestamp_prefix = (None, "")
+        # tuple of record keys => (output keys, template, scaled positions):
+        self.__plans = {}
+        self.__encoder = self.json_encoder(
+            default=self.json_default,
+            indent=self.json_indent,
+            ensure_ascii=self.json_ensure_ascii,
+        )
+
+    def __timestamp(self, created):
+        # Same rounding as datetime.fromtimestamp():
+        second = int(created)
+        microsecond = round((created - second) * 1e6)
+
+        if microsecond >= 1000000:
+            second += 1
+            microsecond -= 1000000
+
+        cached_second, prefix = self.__timestamp_prefix
+
+        if second != cached_second:
+            prefix = datetime.fromtimestamp(second).strftime("%Y-%m-%dT%H:%M:%S.")
+            self.__timestamp_prefix = (second, prefix)
+
+        return f"{prefix}{microsecond:06d}Z"
+
+    def __make_plan(self, keys):
+        output_keys = tuple(key for key in keys if key not in self.SKIPPED_KEYS)
+
+        # Same as as_logged(): rescale whichever of lighting_1..lighting_7 are there
+        scaled = [i for i, key in enumerate(output_keys) if key in LIGHTING_KEYS]
+
+        if all(type(key) is str and _is_plain_str(key) for key in output_keys):
+            fields = "".join(", {}: %s".format(self.__encoder.encode(key)) for key in output_keys)
+            template = '{"timestamp": "%s", "level": "%s"' + fields + "}"
+        else:
+            # Leave odd keys to the stdlib encoder:
+            template = None
+
+        if len(self.__plans) >= self.MAX_PLANS:
+            self.__plans.clear()
+
+        plan = self.__plans[keys] = (output_keys, template, tuple(scaled))
+        return plan
+
+    def format(self, record):
+        state = record.msg
+
+        if type(state) is not dict or record.exc_info or record.stack_info:
+            return super(FastJsonFormatter, self).format(record)
+
+        keys = tuple(state)
+        plan = self.__plans.get(keys)
+
+        if plan is None:
+            plan = self.__make_plan(keys)
+
+        output_keys, template, scaled = plan
+        values = [state[key] for key in output_keys]
+
+        for i in scaled:
+            values[i] = scale_lighting(values[i])
+
+        timestamp = self.__timestamp(record.created)
+
+        if (
+            template is not None
+            and orjson is not None
+            and self.json_indent is None
+            and self.json_ensure_ascii
+            and _PLAIN_TYPES.issuperset(map(type, values))
+        ):
+            try:
+                encoded = orjson.dumps(values).decode("ascii")[1:-1]
+            except (TypeError, UnicodeDecodeError):
+                # An int too big for orjson, or a non-ASCII string that json.dumps would escape
+                encoded = None
+
+            if encoded is not None and _matches_json_dumps(encoded):
+                encoded = encoded.split(",") if values else []
+
+                # A string containing a comma would have split into more parts:
+                if len(encoded) == len(values):
+                    return template % (timestamp, record.levelname, *encoded)
+
+        log_record = {"timestamp": timestamp, "level": record.levelname}
+        log_record.update(zip(output_keys, values))
+        return self.__encoder.encode(log_record)
+
+
+def _is_plain_str(value):
+    """True for strings that can be used as-is as FastJsonFormatter template keys"""
+    return (
+        value.isascii()
+        and value.isprintable()
+        and '"' not in value
+        and "\\" not in value
+        and "%" not in value
+    )
+
+
+# The value types that orjson encodes like json.dumps, give or take the cases below:
+_PLAIN_TYPES = frozenset((float, int, str, bool, type(None)))
+
+
+def _matches_json_dumps(encoded):
+    """False if json.dumps might have written orjson's output differently
+
+    That is floats below 1e-4 (0.00001 vs 1e-05) or from 1e16 up (1e16 vs 1e+16), NaN and
+    infinities (null vs NaN/Infinity) and DEL (raw vs \\u007f). This errs on the side of caution,
+    e.g. a None or a string with an "e" in it also fail, such records simply take the stdlib path.
+    """
+    return not (
+        "null" in encoded
+        or ".0000" in encoded
+        or "\x7f" in encoded
+        # Every "e" should come from a true or a false, not an exponent:
+        or encoded.count("e") != encoded.count("true") + encoded.count("false")
+    )
+
+
+class LoggerRegistry:
+    """Hands out one logger per chamber, however many times it is asked for
+
+    logging.getLogger() returns the same logger for the same name, so attaching a new FileHandler
+    on every get_logger() call (as a long-lived daemon, notebook or test run would) leaks a file
+    descriptor and duplicates every line. The registry remembers what it attached for each chamber
+    and reuses it, replacing it only if the log directory or the settings change.
+    """
+
+    def __init__(self):
+        # chamber_id => (settings, logger, writing handler, writer)
+        self.__entries = {}
+        self.__lock = threading.Lock()
+
+    def get(
+        self,
+        chamber_id,
+        log_dir_path,
+        writer=None,
+        fast_json=False,
+        rotation=None,
+        deadband=None,
+    ):
+        settings = (Path(log_dir_path).resolve(), id(writer), fast_json, rotation, deadband)
+
+        with self.__lock:
+            entry = self.__entries.get(chamber_id)
+
+            if entry is not None:
+                if entry[0] == settings:
+                    return entry[1]
+                self.__close(chamber_id)
+
+            logger, log_handler = _build_logger(
+                chamber_id, log_dir_path, writer, fast_json, rotation, deadband
+            )
+            self.__entries[chamber_id] = (settings, logger, log_handler, writer)
+            return logger
+
+    def __close(self, chamber_id):
+        settings, logger, log_handler, writer = self.__entries.pop(chamber_id)
+
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+
+        for log_filter in list(logger.filters):
+            logger.removeFilter(log_filter)
+
+        if writer is not None:
+            writer.remove(logger.name)
+
+        log_handler.close()
+
+    def release(self, chamber_id):
+        """Detaches and closes a chamber's log file"""
+
+        with self.__lock:
+            if chamber_id in self.__entries:
+                self.__close(chamber_id)
+
+    def retain(self, chamber_ids):
+        """Closes the log files of every chamber not in chamber_ids, e.g. after a config change"""
+
+        chamber_ids = set(chamber_ids)
+
+        with self.__lock:
+            for chamber_id in [c for c in self.__entries if c not in chamber_ids]:
+                self.__close(chamber_id)
+
+    def close(self):
+        self.retain(())
 
+    def chamber_ids(self):
+        with self.__lock:
+            return list(self.__entries)
 
-def get_logger(chamber_id: int, log_dir_path: Path):
-    """Convenience function for getting a logger instance"""
 
-    formatter = CustomJsonFormatter("%(timestamp)s %(level)s %(message)s")
+_registry = LoggerRegistry()
+
+
+def _build_logger(chamber_id, log_dir_path, writer, fast_json, rotation, deadband):
+    formatter_class = FastJsonFormatter if fast_json else CustomJsonFormatter
+    formatter = formatter_class("%(timestamp)s %(level)s %(message)s")
     # When working with multiple loggers, it seems that passing a name to getLogger is necessary,
     # or else you'll get things logging to unexpected places
     logger = logging.getLogger(f"chamber_{chamber_id}_logger")
-    log_handler = logging.FileHandler(
-        log_dir_path / f"chamber_{chamber_id}_environment.log"
-    )
-    log_handler.setFormatter(formatter)
+    log_file_path = Path(log_dir_path) / f"chamber_{chamber_id}_environment.log"
+
+    if rotation:
+        file_handler = RotatingChamberFileHandler(log_file_path, **rotation)
+    else:
+        file_handler = logging.FileHandler(log_file_path)
+    file_handler.setFormatter(formatter)
+    log_handler = file_handler
+
+    if writer is not None:
+        log_handler = writer.handler_for(logger.name, file_handler)
+
     logger.addHandler(log_handler)
     logger.setLevel(logging.INFO)
-    return logger
 
+    if deadband:
+        logger.addFilter(
+            DeltaFilter(
+                keyframe_interval=deadband.get("keyframe_interval", DEFAULT_KEYFRAME_INTERVAL),
+                deadbands=deadband.get("fields"),
+            )
+        )
+
+    return logger, file_handler
+
+
+def get_logger(
+    chamber_id: int,
+    log_dir_path: Path,
+    writer: QueuedLogWriter = None,
+    fast_json: bool = False,
+    rotation: dict = None,
+    deadband: dict = None,
+):
+    """Convenience function for getting a logger instance
+
+    Loggers are cached per chamber, so calling this repeatedly is cheap and never attaches a
+    second file handler. If a writer is given, the logger only enqueues its records and the
+    writer's thread does the formatting and the file I/O. `fast_json` selects the
+    FastJsonFormatter, and `rotation` holds RotatingChamberFileHandler settings (max_bytes, when,
+    compression) if the log files should be rotated. `deadband` (keyframe_interval and per-field
+    deadbands in fields) switches the logger to change-only logging, see deadband.py.
+    """
+    return _registry.get(
+        chamber_id,
+        log_dir_path,
+        writer=writer,
+        fast_json=fast_json,
+        rotation=rotation,
+        deadband=deadband,
+    )
+
+
+def release_logger(chamber_id: int):
+    """Closes a chamber's log file, the next get_logger() call for it will reopen it"""
+    _registry.release(chamber_id)
 
-def main():
-    DEFAULT_CHAMBER_IDS = (1, 2, 3, 4, 6, 7, 8)
 
-    if len(sys.argv) == 2:
-        yaml_filepath_str = sys.argv[-1]
+def retain_loggers(chamber_ids):
+    """Closes the log files of all chambers other than chamber_ids"""
+    _registry.retain(chamber_ids)
 
+
+DEFAULT_CHAMBER_IDS = (1, 2, 3, 4, 6, 7, 8)
+# Seconds between collection cycles when running as a daemon:
+DEFAULT_INTERVAL = 60.0
+
+
+def load_config(yaml_filepath_str=None):
+    """Reads the (optional) yaml config file and fills in defaults for anything not specified"""
+
+    config = {}
+
+    if yaml_filepath_str:
         with open(yaml_filepath_str, "r") as config_handle:
-            config = yaml.load(config_handle, Loader=yaml.Loader)
-            chamber_ids = config.get("chamber_ids", DEFAULT_CHAMBER_IDS)
-            log_path = Path(config.get("log_directory", "."))
-            log_path.mkdir(exist_ok=True, parents=True)
+            config = yaml.load(config_handle, Loader=yaml.Loader) or {}
+
+    config.setdefault("chamber_ids", DEFAULT_CHAMBER_IDS)
+    config["log_directory"] = Path(config.get("log_directory", "."))
+    config.setdefault("max_concurrency", DEFAULT_MAX_CONCURRENCY)
+    config.setdefault("attempts", DEFAULT_ATTEMPTS)
+    config["interval"] = float(config.get("interval", DEFAULT_INTERVAL))
+    # Optional chamber_id => interval overrides:
+    config["chamber_intervals"] = config.get("chamber_intervals") or {}
+    # Seconds between reads of the slow-changing tags (targets, modes, lights) in daemon mode,
+    # 0 reads every tag every time:
+    config["slow_tag_interval"] = float(config.get("slow_tag_interval", DEFAULT_SLOW_INTERVAL))
+    # Optional chamber_id => slow_tag_interval overrides:
+    config["chamber_slow_tag_intervals"] = config.get("chamber_slow_tag_intervals") or {}
+    # Optional failure_threshold / base_backoff / max_backoff settings:
+    config["circuit_breaker"] = config.get("circuit_breaker") or {}
+    # Rate limiting of the requests to each controller, off unless `true` or {rate: ..., burst: ...,
+    # max_in_flight: ..., max_wait: ...}:
+    rate_limit = config.get("rate_limit")
+    config["rate_limit"] = {} if rate_limit is True else (rate_limit or None)
+    config.setdefault("log_queue_size", DEFAULT_QUEUE_SIZE)
+    config.setdefault("log_queue_overflow", DEFAULT_OVERFLOW)
+    config.setdefault("log_queue_stats_interval", DEFAULT_STATS_INTERVAL)
+    config.setdefault("fast_json", False)
+    # Optional max_bytes / when / compression settings, no rotation by default:
+    config["rotation"] = config.get("rotation") or None
+    # Optional keyframe_interval / fields settings, full records every time by default:
+    config["deadband"] = config.get("deadband") or None
+    # Optional SQLite database that every reading is also stored in:
+    config["sqlite_path"] = config.get("sqlite_path") or None
+    # Also write fixed-width binary logs (chamber_<id>_environment.bin) next to the JSON ones:
+    config["binary_log"] = bool(config.get("binary_log", False))
+    # Optional SQLite database of running 1m/1h/1d aggregates, updated as readings come in:
+    config["aggregates_path"] = config.get("aggregates_path") or None
+    # Optional local HTTP API serving the latest readings, `true` or {host: ..., port: ...}:
+    state_api = config.get("state_api")
+    config["state_api"] = {} if state_api is True else (state_api or None)
+
+    if yaml_filepath_str:
+        config["log_directory"].mkdir(exist_ok=True, parents=True)
+
+    return config
+
+
+def run_cycle(
+    loggers,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    breakers=None,
+    attempts=DEFAULT_ATTEMPTS,
+    sinks=(),
+):
+    """Reads every chamber in the chamber_id => logger dict once and logs the results
+
+    The whole cycle is also handed to each of `sinks` (SQLiteSink, BinarySink, AggregateSink) in
+    one go.
+    """
+
+    # Read all of the chambers at once, then write the logs:
+    states = collect(
+        loggers.keys(),
+        max_concurrency=max_concurrency,
+        breakers=breakers,
+        attempts=attempts,
+    )
+
+    for chamber_id, state in states.items():
+        log_state(loggers[chamber_id], state)
 
+    for sink in sinks:
+        # One broken sink doesn't keep the cycle from the others:
+        try:
+            sink.write_cycle(states)
+        except Exception:
+            sink_logger.exception("%s failed", type(sink).__name__)
+
+
+def log_state(logger, state):
+    """Writes a single chamber reading to its logger"""
+
+    if is_reading(state):
+        logger.info(msg=state)
     else:
-        # No yaml configuration file found in the call
-        chamber_ids = DEFAULT_CHAMBER_IDS
-        log_path = Path(".")
+        logger.error(msg=state)
+
+
+def run_daemon(
+    loggers,
+    interval=DEFAULT_INTERVAL,
+    chamber_intervals=None,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    breakers=None,
+    attempts=DEFAULT_ATTEMPTS,
+    sinks=(),
+    slow_interval=DEFAULT_SLOW_INTERVAL,
+    chamber_slow_intervals=None,
+):
+    """Samples every chamber on its wall-clock interval until interrupted
+
+    Imports, config parsing and log handler setup all happen once, so each sample only pays for
+    the HTTP request and the parsing of the response. Readings are also handed to each of `sinks`
+    as they come in, on the event loop thread: sinks that do disk I/O (SQLiteSink, BinarySink,
+    AggregateSink) belong behind a QueuedSinkWriter, which only enqueues. With a `slow_interval`
+    (or a chamber_id => seconds override in `chamber_slow_intervals`) the targets and modes are
+    only read that often, the samples in between only read the actual values.
+    """
+
+    chamber_slow_intervals = chamber_slow_intervals or {}
+    slow_intervals = {
+        chamber_id: float(chamber_slow_intervals.get(chamber_id, slow_interval))
+        for chamber_id in loggers
+    }
+
+    def handle_state(chamber_id, state):
+        log_state(loggers[chamber_id], state)
+        for sink in sinks:
+            try:
+                sink.add(state)
+            except Exception:
+                sink_logger.exception("chamber %s: %s failed", chamber_id, type(sink).__name__)
+
+    schedule = scheduler.build_schedule(
+        loggers.keys(), interval, chamber_intervals=chamber_intervals
+    )
+    scheduler.run(
+        schedule,
+        handle_state,
+        max_concurrency=max_concurrency,
+        breakers=breakers,
+        attempts=attempts,
+        slow_intervals=slow_intervals,
+    )
+
+
+def _stop_on_sigterm(signum, frame):
+    # docker stop, systemctl stop and kill send SIGTERM: stop the way Ctrl-C does, so the queued
+    # log records and buffered sink rows are still written. As PID 1 in a container, an unhandled
+    # SIGTERM would be ignored outright.
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="enviratronlogger", description="Logs growth chamber conditions"
+    )
+    parser.add_argument("config", nargs="?", help="path to the yaml config file")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="keep running and collect on the configured interval instead of once",
+    )
+    args = parser.parse_args()
+
+    # If no yaml configuration file is found in the call, the defaults are used:
+    config = load_config(args.config)
+
+    if config.get("base_url"):
+        # e.g. to point the logger at a local emulator instead of the real controllers:
+        gcc.BASE_URL = config["base_url"]
+
+    if config["rate_limit"] is not None:
+        gcc.configure_limits(**config["rate_limit"])
+
+    if config["deadband"] and not args.daemon:
+        # The encoder only remembers the last record within one process:
+        main_logger.warning(
+            "deadband is set without --daemon: every one-shot run writes a full keyframe"
+        )
+
+    # Log records are written on a dedicated thread so that a slow disk never stalls collection:
+    # Records dropped by a full queue are reported as warnings every log_queue_stats_interval:
+    writer = QueuedLogWriter(
+        maxsize=config["log_queue_size"],
+        overflow=config["log_queue_overflow"],
+        stats_interval=config["log_queue_stats_interval"],
+    )
+    writer.start()
+
+    loggers = {
+        chamber_id: get_logger(
+            chamber_id,
+            log_dir_path=config["log_directory"],
+            writer=writer,
+            fast_json=config["fast_json"],
+            rotation=config["rotation"],
+            deadband=config["deadband"],
+        )
+        for chamber_id in config["chamber_ids"]
+    }
+    breakers = {
+        chamber_id: get_breaker(chamber_id, **config["circuit_breaker"])
+        for chamber_id in config["chamber_ids"]
+    }
+    # Carried over between runs, so that under cron an unreachable controller stays backed off
+    # instead of being retried (and timed out on) every minute:
+    breakers_path = Path(config["log_directory"]) / STATE_FILE_NAME
+    load_breakers(breakers_path, breakers)
+
+    stores = []
+    if config["sqlite_path"]:
+        # One transaction per cycle: a batch holds one row for each chamber
+        stores.append(
+            SQLiteSink(
+                config["sqlite_path"],
+                batch_size=len(config["chamber_ids"]),
+                max_delay=config["interval"],
+            )
+        )
+    if config["binary_log"]:
+        stores.append(BinarySink(config["log_directory"]))
+    if config["aggregates_path"]:
+        stores.append(
+            AggregateSink(
+                config["aggregates_path"],
+                batch_size=len(config["chamber_ids"]),
+                max_delay=config["interval"],
+            )
+        )
+
+    sinks = []
+    latest_states = None
+    # A one-shot run would only hold the port for a single cycle, or collide with the daemon's:
+    if config["state_api"] is not None and args.daemon:
+        # Only kept in memory, so it is updated straight away:
+        latest_states = LatestStates()
+        sinks.append(latest_states)
+    if stores:
+        # Like the log records, readings reach the databases through a queue and a thread of their
+        # own, so a slow disk never stalls collection:
+        sink_writer = QueuedSinkWriter(
+            stores,
+            maxsize=config["log_queue_size"],
+            overflow=config["log_queue_overflow"],
+            stats_interval=config["log_queue_stats_interval"],
+        )
+        sink_writer.start()
+        sinks.append(sink_writer)
+
+    state_api = None
+    signal.signal(signal.SIGTERM, _stop_on_sigterm)
 
-    for chamber_id in chamber_ids:
-        logger = get_logger(chamber_id, log_dir_path=log_path)
-        chamber = gcc(chamber_id)
-        state = chamber.get_state()
+    try:
+        if latest_states is not None:
+            # Lab tools read the latest states from here instead of polling the controllers:
+            state_api = StateAPI(latest_states, **config["state_api"]).start()
 
-        if state.get("type") == "ConnectionError":
-            logger.error(msg=state)
+        if args.daemon:
+            run_daemon(
+                loggers,
+                interval=config["interval"],
+                chamber_intervals=config["chamber_intervals"],
+                max_concurrency=config["max_concurrency"],
+                breakers=breakers,
+                attempts=config["attempts"],
+                sinks=sinks,
+                slow_interval=config["slow_tag_interval"],
+                chamber_slow_intervals=config["chamber_slow_tag_intervals"],
+            )
         else:
-            logger.info(msg=state)
+            run_cycle(
+                loggers,
+                max_concurrency=config["max_concurrency"],
+                breakers=breakers,
+                attempts=config["attempts"],
+                sinks=sinks,
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # A second SIGTERM doesn't cut the cleanup short:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        # Flush whatever is still queued before exiting:
+        writer.stop()
+        retain_loggers(())
+        save_breakers(breakers_path, breakers)
+        if state_api is not None:
+            state_api.stop()
+        for sink in sinks:
+            sink.close()
 
 
 if __name__ == "__main__":
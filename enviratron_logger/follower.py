@@ -0,0 +1,279 @@
+"""
+Checkpointed tail following of chamber logs
+
+A LogFollower hands a downstream consumer the records appended to a chamber log since it last
+looked, and remembers how far it got in a small checkpoint file, so each poll only reads new data:
+
+    follower = follower_for(Path("chamber_logs"), 1, consumer="influx-export")
+    for record in follower.poll():
+        export(record)
+
+The checkpoint holds the byte offset into the active file plus its inode and first timestamp. When
+the file has been rotated in the meantime the follower finds the segment it was reading (renamed
+or compressed) by that first timestamp, finishes it and any segments after it, then carries on with
+the new active file. Only complete lines are ever returned, a line still being written is picked
+up on the next poll. Deadband deltas are rebuilt into full readings, the last full state is kept
+in the checkpoint too.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from deadband import DELTA_KEY
+from records import is_reading
+from history import TIMESTAMP_FORMAT, log_path_for
+from rotation import open_segment, segment_paths, segment_start
+
+# Checkpoints for a log directory are kept in this sub directory:
+CHECKPOINT_DIR_NAME = ".checkpoints"
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Bytes of the first line that hold its timestamp:
+_HEAD_SIZE = 64
+
+
+class Reading(NamedTuple):
+    """A full chamber reading as logged"""
+
+    timestamp: datetime
+    chamber_id: int
+    values: dict
+
+
+class ErrorRecord(NamedTuple):
+    """A failed read as logged, see collector.error_record()"""
+
+    timestamp: datetime
+    chamber_id: Optional[int]
+    type: str
+    error: str
+    values: dict
+
+
+def _first_timestamp(log_file):
+    """The timestamp of the first line of an open binary file, or None if it's still empty"""
+
+    head = log_file.read(_HEAD_SIZE)
+    prefix = b'"timestamp": "'
+    field = head.find(prefix)
+
+    if field < 0:
+        return None
+
+    field += len(prefix)
+    end = head.find(b'"', field)
+    return head[field:end].decode("ascii") if end > 0 else None
+
+
+def _segment_first_timestamp(path):
+    with open_segment(path, binary=True) as segment:
+        return _first_timestamp(segment)
+
+
+def checkpoint_path_for(log_dir_path, chamber_id, consumer):
+    return Path(log_dir_path) / CHECKPOINT_DIR_NAME / f"{consumer}.chamber_{chamber_id}.json"
+
+
+def follower_for(log_dir_path, chamber_id, consumer):
+    """The follower of one chamber's log for the named consumer"""
+
+    return LogFollower(
+        log_path_for(log_dir_path, chamber_id),
+        checkpoint_path_for(log_dir_path, chamber_id, consumer),
+    )
+
+
+class LogFollower:
+    """Reads the records appended to a log since the last commit()ed position"""
+
+    def __init__(self, log_path, checkpoint_path):
+        self.log_path = Path(log_path)
+        self.checkpoint_path = Path(checkpoint_path)
+        self.__position = self.__load_checkpoint()
+
+    def __load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r") as checkpoint_file:
+                return json.load(checkpoint_file)
+        except FileNotFoundError:
+            # A new consumer starts at the beginning of the active file:
+            return {
+                "inode": None,
+                "first_timestamp": None,
+                "offset": 0,
+                "last_timestamp": None,
+                "state": None,
+            }
+
+    @property
+    def position(self):
+        """(inode, first_timestamp, offset) of the next unread byte"""
+
+        return (
+            self.__position["inode"],
+            self.__position["first_timestamp"],
+            self.__position["offset"],
+        )
+
+    def commit(self):
+        """Persists the current position, so the next follower for this consumer starts there"""
+
+        self.checkpoint_path.parent.mkdir(exist_ok=True, parents=True)
+        part = self.checkpoint_path.with_name(self.checkpoint_path.name + ".part")
+
+        with open(part, "w") as checkpoint_file:
+            json.dump(self.__position, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+        part.replace(self.checkpoint_path)
+
+    def __rotated_segments(self):
+        """The segments to read after a rotation, oldest first, and whether the first of them is the
+        file that was being read (so reading resumes at the saved offset)"""
+
+        position = self.__position
+        segments = segment_paths(self.log_path)[:-1]
+        first_timestamp = position["first_timestamp"]
+
+        if first_timestamp is not None:
+            started = _floor_second(first_timestamp)
+            for index, path in enumerate(segments):
+                # Segments are named after their first record, only open the ones that could match:
+                if segment_start(path) == started and (
+                    _segment_first_timestamp(path) == first_timestamp
+                ):
+                    return segments[index:], True
+
+        # The file was still empty when it was last read, or its segment has been deleted since:
+        # everything that starts after the last record read is new.
+        last_timestamp = position["last_timestamp"]
+        if last_timestamp is None:
+            return segments, False
+
+        cutoff = _floor_second(last_timestamp)
+        for index, path in enumerate(segments):
+            begins = segment_start(path)
+            if begins is not None and begins >= cutoff:
+                if (_segment_first_timestamp(path) or "") > last_timestamp:
+                    return segments[index:], False
+
+        return [], False
+
+    def __read(self, log_file, offset):
+        """Yields the complete lines of log_file from offset on as (line, next offset)"""
+
+        for line in log_file:
+            if not line.endswith(b"\n"):
+                # Still being written:
+                return
+            offset += len(line)
+            yield line, offset
+
+    def __record(self, line):
+        record = json.loads(line)
+        self.__position["last_timestamp"] = record["timestamp"]
+        timestamp = datetime.strptime(record.pop("timestamp"), TIMESTAMP_FORMAT)
+        record.pop("level", None)
+
+        if not is_reading(record):
+            return ErrorRecord(
+                timestamp,
+                record.get("chamber_id"),
+                record["type"],
+                record.get("error", ""),
+                record,
+            )
+
+        if record.pop(DELTA_KEY, None) is True:
+            state = self.__position["state"]
+            if state is None:
+                # A delta from before the first keyframe this consumer saw can't be completed:
+                return None
+            state.update(record)
+            record = dict(state)
+        else:
+            self.__position["state"] = dict(record)
+
+        return Reading(timestamp, record.get("chamber_id"), record)
+
+    def __records(self, log_file, offset):
+        for line, offset in self.__read(log_file, offset):
+            record = self.__record(line)
+            self.__position["offset"] = offset
+            if record is not None:
+                yield record
+
+    def poll(self, commit=True):
+        """Yields the Reading and ErrorRecord objects appended since the last position, lazily
+
+        The position moves past each record as it is yielded and, with `commit`, is saved once the
+        generator is exhausted; a consumer that stops early can call commit() itself.
+        """
+
+        position = self.__position
+
+        try:
+            active = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return
+
+        with active:
+            # Of the file actually opened, in case it was rotated a moment ago:
+            stat = os.fstat(active.fileno())
+            first_timestamp = _first_timestamp(active)
+
+            # A file that was empty when last read has no first timestamp to compare yet:
+            rotated = position["inode"] is not None and (
+                position["inode"] != stat.st_ino
+                or position["first_timestamp"] not in (None, first_timestamp)
+            )
+
+            if rotated:
+                # Finish the file we were reading, wherever it went, and anything rotated after it:
+                segments, resume = self.__rotated_segments()
+
+                for index, path in enumerate(segments):
+                    offset = position["offset"] if index == 0 and resume else 0
+                    with open_segment(path, binary=True) as segment:
+                        _skip(segment, offset)
+                        yield from self.__records(segment, offset)
+
+                position["offset"] = 0
+
+            elif stat.st_size < position["offset"]:
+                # Truncated in place, start over:
+                position["offset"] = 0
+
+            position["inode"] = stat.st_ino
+            position["first_timestamp"] = first_timestamp
+
+            active.seek(position["offset"])
+            yield from self.__records(active, position["offset"])
+
+        if commit:
+            self.commit()
+
+    def follow(self, interval=DEFAULT_POLL_INTERVAL):
+        """poll()s forever, yielding records as they are appended"""
+
+        while True:
+            yield from self.poll()
+            time.sleep(interval)
+
+
+def _floor_second(timestamp):
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT).replace(microsecond=0)
+
+
+def _skip(log_file, offset):
+    # Compressed streams can't always seek, so read past the consumed part:
+    while offset > 0:
+        skipped = len(log_file.read(min(offset, 1 << 20)))
+        if skipped == 0:
+            break
+        offset -= skipped
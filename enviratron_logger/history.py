@@ -0,0 +1,276 @@
+"""
+Reading chamber history back out of the JSON-lines logs
+
+Rotated (and compressed) segments are read in order followed by the active file, and keyframe
+plus delta streams written in deadband mode are rebuilt into full records, so callers always see
+one full record per line that was logged:
+
+    for record in read_chamber(Path("chamber_logs"), 1, start=datetime(2021, 9, 15)):
+        print(record["timestamp"], record["temperature_actual"])
+
+Records are written in timestamp order, so a time range doesn't need a full scan: segments that end
+before `start` are skipped by their file names, and in an uncompressed file the first line at or
+after `start` is found by bisecting over an mmap of it. Only the lines in the range (plus the
+keyframe a leading delta needs) are decoded. From the command line:
+
+    python history.py chamber_logs 1 --start 2021-09-15 --end 2021-09-16
+"""
+
+import argparse
+import json
+import mmap
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from deadband import rebuild
+from rotation import open_segment, segment_paths, segment_start
+
+# The format of the "timestamp" field, fixed width so that timestamps compare as strings:
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def log_path_for(log_dir_path, chamber_id):
+    return Path(log_dir_path) / f"chamber_{chamber_id}_environment.log"
+
+
+def to_timestamp(value):
+    """Turns a datetime (or an already formatted string) into a comparable "timestamp" string"""
+
+    if value is None or isinstance(value, str):
+        return value
+
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def iter_lines(log_path):
+    """Yields the raw lines of a log file and all of its rotated segments, oldest first"""
+
+    for path in segment_paths(log_path):
+        yield from _read_lines(path)
+
+
+_TIMESTAMP_PREFIX = b'"timestamp": "'
+_DELTA_MARKER = b'"delta": true'
+# Readings are logged at INFO, error records at ERROR:
+_READING_MARKER = b'"level": "INFO"'
+
+
+def _line_timestamp(mapped, line_start):
+    """The "timestamp" of the line starting at line_start, without decoding the rest of it"""
+
+    field = mapped.find(_TIMESTAMP_PREFIX, line_start, line_start + 64)
+    if field < 0:
+        return ""
+
+    field += len(_TIMESTAMP_PREFIX)
+    return mapped[field : mapped.find(b'"', field)].decode("ascii")
+
+
+def _next_line(mapped, offset):
+    """The start of the first line at or after offset"""
+
+    if offset == 0:
+        return 0
+
+    newline = mapped.find(b"\n", offset - 1)
+    return len(mapped) if newline < 0 else newline + 1
+
+
+def _bisect(mapped, start):
+    """The offset of the first line whose timestamp is >= start (or the end of the file)"""
+
+    # low is always the start of a line and every line before it is older than start:
+    low, high = 0, len(mapped)
+
+    while low < high:
+        middle = (low + high) // 2
+        line_start = _next_line(mapped, middle)
+
+        if line_start >= high:
+            # No line starts between middle and high:
+            high = middle
+        elif _line_timestamp(mapped, line_start) < start:
+            low = mapped.find(b"\n", line_start) + 1 or len(mapped)
+        else:
+            high = line_start
+
+    return low
+
+
+def _line_kind(mapped, line_start):
+    """"delta", "keyframe" (a full reading) or None (an error record) for the line at line_start"""
+
+    # The markers are well within the first 96 bytes of a line:
+    head = mapped[line_start : line_start + 96]
+    if _DELTA_MARKER in head:
+        return "delta"
+    return "keyframe" if _READING_MARKER in head else None
+
+
+def _keyframe_before(mapped, offset):
+    """The start of the closest keyframe line at or before offset, or None
+
+    Deltas only make sense on top of the keyframe before them, so decoding starts there if the
+    first reading from offset on is a delta. Otherwise offset is returned as it is.
+    """
+
+    line_start = offset
+    # Error records (neither a delta nor a reading) don't tell either way:
+    while line_start < len(mapped) and _line_kind(mapped, line_start) is None:
+        line_start = mapped.find(b"\n", line_start) + 1 or len(mapped)
+
+    if line_start >= len(mapped) or _line_kind(mapped, line_start) != "delta":
+        return offset
+
+    while line_start > 0:
+        line_start = mapped.rfind(b"\n", 0, line_start - 1) + 1
+        if _line_kind(mapped, line_start) == "keyframe":
+            return line_start
+
+    return None
+
+
+def _starts_with_delta(path):
+    """True if the first reading in a log file or segment is a delta"""
+
+    for line in _read_lines(path):
+        head = line[:96].encode("utf-8")
+        if _DELTA_MARKER in head:
+            return True
+        if _READING_MARKER in head:
+            return False
+
+    return False
+
+
+def _start_offset(path, start):
+    """Where to start reading an uncompressed log to get every record from `start` on
+
+    That's the keyframe before the first line at or after start, or None if the file has deltas
+    there but no keyframe before them, i.e. the keyframe is in the previous segment.
+    """
+
+    if path.stat().st_size == 0:
+        return 0
+
+    with open(path, "rb") as log_file, mmap.mmap(
+        log_file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped:
+        return _keyframe_before(mapped, _bisect(mapped, start))
+
+
+def _read_lines(path, offset=0):
+    """Yields the complete lines of a log file or segment from the byte offset on"""
+
+    if not offset:
+        with open_segment(path) as log_file:
+            for line in log_file:
+                if line.endswith("\n"):
+                    yield line
+        return
+
+    with open(path, "rb") as log_file:
+        log_file.seek(offset)
+        for line in log_file:
+            if line.endswith(b"\n"):
+                yield line.decode("utf-8")
+
+
+def iter_range_lines(log_path, start=None, end=None):
+    """Yields the raw lines that can hold records with start <= timestamp < end, oldest first
+
+    Segments that end before start or begin at or after end are skipped without being opened.
+    """
+
+    paths = segment_paths(log_path)
+    # A segment's name holds the second its first record was written in, so the next segment
+    # starting at least a second before `start` means this one ends before it:
+    ends = [segment_start(path) for path in paths[1:]] + [None]
+    first = 0
+
+    if start is not None:
+        while (
+            first < len(paths) - 1
+            and ends[first] is not None
+            and to_timestamp(ends[first] + timedelta(seconds=1)) <= start
+        ):
+            first += 1
+
+    seek_start = start is not None
+
+    for index in range(first, len(paths)):
+        path = paths[index]
+        begins = segment_start(path)
+
+        if end is not None and begins is not None and to_timestamp(begins) >= end:
+            break
+
+        offset = 0
+        if seek_start:
+            # Compressed segments can't be mapped, they are read from the top:
+            if path.suffix == ".log":
+                offset = _start_offset(path, start)
+                if offset is not None and offset >= path.stat().st_size:
+                    # Every line is older than start, the range begins in the next file:
+                    continue
+
+            seek_start = False
+            if offset is None or (offset == 0 and _starts_with_delta(path)):
+                offset = 0
+                # The keyframe for the leading deltas is in an earlier segment:
+                keyframe_index = index - 1
+                while keyframe_index > 0 and _starts_with_delta(paths[keyframe_index]):
+                    keyframe_index -= 1
+                for earlier in paths[max(keyframe_index, 0) : index]:
+                    yield from _read_lines(earlier)
+
+        yield from _read_lines(path, offset)
+
+
+def read_records(log_path, start=None, end=None):
+    """Yields the full records in a log file (and its segments) with start <= timestamp < end
+
+    `start` and `end` are datetimes or "timestamp" strings; prefixes like "2021-09-15" work too.
+    """
+
+    start = to_timestamp(start)
+    end = to_timestamp(end)
+    records = rebuild(json.loads(line) for line in iter_range_lines(log_path, start, end))
+
+    for record in records:
+        timestamp = record.get("timestamp", "")
+
+        if start is not None and timestamp < start:
+            continue
+        if end is not None and timestamp >= end:
+            # Records are written in time order:
+            break
+
+        yield record
+
+
+def read_chamber(log_dir_path, chamber_id, start=None, end=None):
+    """read_records() for a chamber's log in log_dir_path"""
+    return read_records(log_path_for(log_dir_path, chamber_id), start=start, end=end)
+
+
+def parse_timestamp(timestamp):
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="enviratronhistory", description="Prints a chamber's logged records in a time range"
+    )
+    parser.add_argument("log_directory", help="the directory the chamber logs are written to")
+    parser.add_argument("chamber_id", type=int)
+    parser.add_argument("--start", help="first timestamp to include, e.g. 2021-09-15T12:00")
+    parser.add_argument("--end", help="timestamp to stop before, e.g. 2021-09-16")
+    args = parser.parse_args()
+
+    for record in read_chamber(args.log_directory, args.chamber_id, args.start, args.end):
+        sys.stdout.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
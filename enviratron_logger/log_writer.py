@@ -0,0 +1,237 @@
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+writer_logger = logging.getLogger("enviratron_log_writer")
+sink_logger = logging.getLogger("enviratron_sinks")
+
+# How many records may be waiting to be written before the overflow policy kicks in:
+DEFAULT_QUEUE_SIZE = 10000
+# What to do when the queue is full: "block" the caller, "drop_newest" or "drop_oldest":
+DEFAULT_OVERFLOW = "block"
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+# Seconds between checks for dropped records, which are logged as a warning (0 turns it off):
+DEFAULT_STATS_INTERVAL = 60.0
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Hands records over to a QueuedLogWriter instead of formatting and writing them
+
+    Unlike the stdlib QueueHandler, records are not formatted here, so the collection threads do
+    nothing but enqueue. All of the formatting and I/O happens on the writer thread.
+    """
+
+    def __init__(self, writer):
+        super(BoundedQueueHandler, self).__init__(writer.queue)
+        self.writer = writer
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        self.writer.put(record)
+
+
+class _Listener(QueueListener):
+
+    def enqueue_sentinel(self):
+        # Wait for room rather than failing if the queue happens to be full at shutdown:
+        self.queue.put(self._sentinel)
+
+
+class QueuedWriter:
+    """A bounded queue plus a single writer thread that handle()s everything put() on it
+
+    Subclasses implement handle(item), which runs on the writer thread.
+    """
+
+    # What is queued, for the drop warnings:
+    QUEUE_NAME = "log"
+
+    def __init__(
+        self,
+        maxsize=DEFAULT_QUEUE_SIZE,
+        overflow=DEFAULT_OVERFLOW,
+        stats_interval=DEFAULT_STATS_INTERVAL,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, not {overflow!r}")
+
+        self.queue = queue.Queue(maxsize)
+        self.overflow = overflow
+        self.dropped = 0
+        self.stats_interval = stats_interval
+        self.__reported_drops = 0
+        self.__stopping = threading.Event()
+        self.__reporter = None
+        self.__lock = threading.Lock()
+        self.__listener = _Listener(self.queue, self)
+
+    def put(self, item):
+        """Enqueues an item, applying the overflow policy if the queue is full"""
+
+        if self.overflow == "block":
+            self.queue.put(item)
+            return
+
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                with self.__lock:
+                    self.dropped += 1
+
+                if self.overflow == "drop_newest":
+                    return
+
+            # drop_oldest: make room and try again
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+    def handle(self, item):
+        raise NotImplementedError
+
+    @property
+    def depth(self):
+        """Number of items waiting to be written"""
+        return self.queue.qsize()
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "maxsize": self.queue.maxsize,
+            "dropped": self.dropped,
+            "overflow": self.overflow,
+        }
+
+    def report(self):
+        """Logs a warning with the stats() if items were dropped since the last report"""
+
+        stats = self.stats()
+
+        with self.__lock:
+            dropped = stats["dropped"] - self.__reported_drops
+            self.__reported_drops = stats["dropped"]
+
+        if dropped > 0:
+            writer_logger.warning(
+                "%s queue full, %s record(s) dropped since the last report "
+                "(%s in total, overflow=%s, depth %s of %s)",
+                self.QUEUE_NAME,
+                dropped,
+                stats["dropped"],
+                stats["overflow"],
+                stats["depth"],
+                stats["maxsize"],
+            )
+
+        return stats
+
+    def __report_periodically(self):
+        while not self.__stopping.wait(self.stats_interval):
+            self.report()
+
+    def start(self):
+        self.__listener.start()
+
+        if self.stats_interval:
+            self.__stopping.clear()
+            self.__reporter = threading.Thread(target=self.__report_periodically, daemon=True)
+            self.__reporter.start()
+
+    def stop(self):
+        """Writes out everything still in the queue and stops the writer thread"""
+
+        if self.__reporter is not None:
+            self.__stopping.set()
+            self.__reporter.join()
+            self.__reporter = None
+
+        self.__listener.stop()
+        # Whatever was dropped since the last periodic report:
+        self.report()
+
+
+class QueuedLogWriter(QueuedWriter):
+    """A bounded queue plus a single writer thread shared by all of the chamber loggers"""
+
+    def __init__(
+        self,
+        maxsize=DEFAULT_QUEUE_SIZE,
+        overflow=DEFAULT_OVERFLOW,
+        stats_interval=DEFAULT_STATS_INTERVAL,
+    ):
+        super(QueuedLogWriter, self).__init__(
+            maxsize=maxsize, overflow=overflow, stats_interval=stats_interval
+        )
+        # logger name => the handler that actually writes that logger's records:
+        self.__handlers = {}
+
+    def handle(self, record):
+        """Called on the writer thread by the QueueListener, routes the record to its file"""
+        handler = self.__handlers.get(record.name)
+
+        if handler is not None:
+            handler.handle(record)
+
+    def handler_for(self, logger_name, handler):
+        """Returns a queue handler for a logger, whose records will be written by `handler`"""
+        self.__handlers[logger_name] = handler
+        return BoundedQueueHandler(self)
+
+    def remove(self, logger_name):
+        """Stops routing records for a logger and returns its writing handler (or None)"""
+        return self.__handlers.pop(logger_name, None)
+
+
+class QueuedSinkWriter(QueuedWriter):
+    """Hands readings to `sinks` on a writer thread of its own; itself a sink, see records.py
+
+    add() and write_cycle() only enqueue, so the collection loop never waits on the disk I/O of
+    SQLiteSink, BinarySink or AggregateSink. A sink that raises is logged and the others still get
+    the reading. close() writes out the queue and closes the sinks.
+    """
+
+    QUEUE_NAME = "sink"
+
+    def __init__(
+        self,
+        sinks,
+        maxsize=DEFAULT_QUEUE_SIZE,
+        overflow=DEFAULT_OVERFLOW,
+        stats_interval=DEFAULT_STATS_INTERVAL,
+    ):
+        super(QueuedSinkWriter, self).__init__(
+            maxsize=maxsize, overflow=overflow, stats_interval=stats_interval
+        )
+        self.sinks = list(sinks)
+
+    def add(self, state, timestamp=None):
+        # Stamped when it was sampled, not when the writer thread gets to it:
+        self.put(("add", state, time.time() if timestamp is None else timestamp))
+
+    def write_cycle(self, states, timestamp=None):
+        self.put(("write_cycle", states, time.time() if timestamp is None else timestamp))
+
+    def flush(self):
+        self.put(("flush",))
+
+    def handle(self, item):
+        method, *args = item
+
+        for sink in self.sinks:
+            try:
+                getattr(sink, method)(*args)
+            except Exception:
+                sink_logger.exception("%s.%s() failed", type(sink).__name__, method)
+
+    def close(self):
+        self.stop()
+
+        for sink in self.sinks:
+            sink.close()
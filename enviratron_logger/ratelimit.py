@@ -0,0 +1,126 @@
+"""
+Per-controller rate limiting of requests
+
+The controllers are slow embedded web servers, a script that fires requests in a loop (or a few of
+them running at once) can bring one to its knees. With rate limiting turned on (the rate_limit
+section of the yaml config, or GrowthChamberControl.configure_limits() in scripts) every request to
+a controller goes through its ControllerLimiter: a token bucket that lets `rate` requests per second
+through on average, with bursts of up to `burst`, plus a cap of `max_in_flight` requests at a time.
+Requests above the limit wait their turn, and raise RateLimitExceeded if they can't be sent within
+`max_wait` seconds. It is off by default, so existing callers see no change unless they opt in.
+"""
+
+import logging
+import threading
+import time
+
+ratelimit_logger = logging.getLogger("enviratron_ratelimit")
+
+# Defaults, all of which can be overridden with the rate_limit section of the yaml config:
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+DEFAULT_MAX_IN_FLIGHT = 2
+DEFAULT_MAX_WAIT = 30.0
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request couldn't be sent to a controller within the limiter's max_wait"""
+
+
+class ControllerLimiter:
+    """A token bucket plus a cap on concurrent requests, for one chamber controller
+
+    Requests are let through at `rate` per second on average, with bursts of up to `burst`, and no
+    more than `max_in_flight` at a time. Callers above the limit wait their turn, for at most
+    `max_wait` seconds, after which RateLimitExceeded is raised instead of adding to the pile of
+    requests the controller is already struggling with. A rate or max_in_flight of 0 (or None)
+    turns that limit off.
+
+        with limiter:
+            session.get(...)
+    """
+
+    def __init__(
+        self,
+        name,
+        rate=DEFAULT_RATE,
+        burst=DEFAULT_BURST,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+        max_wait=DEFAULT_MAX_WAIT,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst or 1, 1)
+        self.max_in_flight = max_in_flight
+        self.max_wait = max_wait
+        self.__clock = clock
+        self.__condition = threading.Condition()
+
+        self.tokens = float(self.burst)
+        self.in_flight = 0
+        self.waiting = 0
+        self.__refilled = clock()
+
+    def __refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.__refilled) * self.rate)
+        self.__refilled = now
+
+    def __ready(self):
+        has_token = not self.rate or self.tokens >= 1
+        has_slot = not self.max_in_flight or self.in_flight < self.max_in_flight
+        return has_token, has_slot
+
+    def acquire(self):
+        """Waits (up to max_wait) until a request may be sent"""
+
+        deadline = self.__clock() + self.max_wait
+
+        with self.__condition:
+            self.waiting += 1
+
+            try:
+                while True:
+                    now = self.__clock()
+                    self.__refill(now)
+                    has_token, has_slot = self.__ready()
+
+                    if has_token and has_slot:
+                        if self.rate:
+                            self.tokens -= 1
+                        self.in_flight += 1
+                        return
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        ratelimit_logger.warning(
+                            "%s: gave up after waiting %ss (in flight=%s, waiting=%s)",
+                            self.name,
+                            self.max_wait,
+                            self.in_flight,
+                            self.waiting,
+                        )
+                        raise RateLimitExceeded(
+                            f"{self.name}: no request slot within {self.max_wait}s"
+                        )
+
+                    # Wake up when the next token is due, or sooner if a request finishes:
+                    if has_token:
+                        self.__condition.wait(remaining)
+                    else:
+                        self.__condition.wait(min(remaining, (1 - self.tokens) / self.rate))
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self.__condition:
+            self.in_flight -= 1
+            self.__condition.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,119 @@
+"""
+What a chamber reading looks like once it is logged
+
+GrowthChamberControl.get_state() returns lighting on Percival's 0-10,000 scale plus an env_var /
+env_val pair describing the last tag read. The JSON logs, and every sink that stores readings next
+to them, drop that pair and rescale lighting to 0-100, as_logged() does both in one place.
+
+A sink is anything with the add(state, timestamp=None) / write_cycle(states, timestamp=None) /
+flush() / close() interface: add() takes one reading or error record as it is collected,
+write_cycle() a chamber_id => state dict from a whole collection cycle (`timestamp` is epoch
+seconds, default now). SQLiteSink, BinarySink, AggregateSink and LatestStates are sinks, the SQLite
+backed ones buffer what they are given and write it in batches, see BufferedSink.
+"""
+
+import threading
+import time
+
+# Percival's 0-10,000 lighting levels, logged on a 0-100 scale:
+LIGHTING_KEYS = tuple(f"lighting_{i}" for i in range(1, 8))
+# Describe the response as a whole rather than the chamber, and are not logged:
+NOT_LOGGED_KEYS = ("env_var", "env_val")
+# Seconds a daemon-mode batch may wait for the rest of its cycle before it is written anyway:
+DEFAULT_MAX_DELAY = 60.0
+
+
+def is_reading(state):
+    """Error records have a "type" key, readings never do"""
+    return isinstance(state, dict) and "type" not in state
+
+
+def is_number(value):
+    """True for ints and floats, but not for the bools and strings a reading can also hold"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def scale_lighting(value):
+    # A level the controller sent as text (e.g. "----") is left as it is:
+    return value / 100 if is_number(value) else value
+
+
+def as_logged(state):
+    """A copy of a reading the way CustomJsonFormatter writes it, in the same key order"""
+
+    return {
+        key: scale_lighting(value) if key in LIGHTING_KEYS else value
+        for key, value in state.items()
+        if key not in NOT_LOGGED_KEYS
+    }
+
+
+class BufferedSink:
+    """The batching shared by the sinks that write to a database
+
+    add() buffers one record and writes the batch once it holds `batch_size` records (0 for no
+    limit) or its oldest record is `max_delay` seconds old. In daemon mode, where chambers report
+    one at a time, batch_size is the number of chambers, so a batch is normally one cycle. Error
+    records count towards it too, or a mostly failing fleet would hold a batch open until
+    max_delay. write_cycle() buffers a whole cycle and writes it straight away.
+
+    Subclasses implement _buffer(state, timestamp), _write() (write out and clear the buffer) and
+    _close(), which are called with `_lock` held.
+    """
+
+    def __init__(self, batch_size=0, max_delay=DEFAULT_MAX_DELAY):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self.__pending = 0
+        self.__oldest = None
+
+    def add(self, state, timestamp=None):
+        """Buffers one reading or error record, sampled at `timestamp` (epoch seconds, default now)"""
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            self._buffer(state, timestamp)
+            self.__pending += 1
+
+            if self.__oldest is None:
+                self.__oldest = timestamp
+
+            due = (self.batch_size and self.__pending >= self.batch_size) or (
+                timestamp - self.__oldest >= self.max_delay
+            )
+
+            if due:
+                self.__flush()
+
+    def write_cycle(self, states, timestamp=None):
+        """Writes a chamber_id => state dict from one collection cycle in a single batch"""
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            for state in states.values():
+                self._buffer(state, timestamp)
+
+            self.__flush()
+
+    def flush(self):
+        """Writes whatever is buffered"""
+
+        with self._lock:
+            self.__flush()
+
+    def __flush(self):
+        self._write()
+        self.__pending = 0
+        self.__oldest = None
+
+    def close(self):
+        """Writes whatever is still buffered and closes the store"""
+
+        with self._lock:
+            self.__flush()
+            self._close()
@@ -0,0 +1,266 @@
+"""
+Vectorized rollups of chamber history
+
+Loads a chamber's readings into one NumPy column per numeric field and computes the count, min,
+mean and max of every field per time bucket in a handful of vectorized reduceat() calls, for any
+bucket width:
+
+    hourly = rollup(Path("chamber_logs"), 1, "1h")
+    hourly["start"], hourly["temperature_actual_mean"], hourly["co2_actual_max"]
+
+Buckets are aligned to the epoch in the logs' own (local) time, so "1d" buckets start at midnight.
+Both the loaded columns and each rollup are cached under `<log_dir>/.rollup_cache/` and reused until
+the chamber's log files change on disk. Needs numpy (`pip install numpy`).
+"""
+
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy is an optional extra
+    numpy = None
+
+import binary_log
+import history
+from records import is_number, is_reading
+from rotation import segment_paths
+
+# Every numeric field of a reading, as stored in the binary logs:
+NUMERIC_FIELDS = binary_log.FLOAT_FIELDS
+AGGREGATES = ("min", "mean", "max")
+CACHE_DIR_NAME = ".rollup_cache"
+# Bump when the cache file layout changes:
+CACHE_VERSION = 1
+
+_WIDTH_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_WIDTH_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([smhd]?)$")
+
+
+def _require_numpy():
+    if numpy is None:
+        raise RuntimeError("rollups need numpy, pip install numpy")
+
+
+def parse_width(width):
+    """Bucket width in whole microseconds from seconds or a string like "90s", "15m", "1h", "1d" """
+
+    if isinstance(width, str):
+        match = _WIDTH_PATTERN.match(width.strip())
+        if match is None:
+            raise ValueError(f"invalid bucket width {width!r}")
+        seconds = float(match.group(1)) * _WIDTH_UNITS[match.group(2) or "s"]
+    else:
+        seconds = float(width)
+
+    microseconds = int(round(seconds * 1_000_000))
+    if microseconds <= 0:
+        raise ValueError(f"bucket width must be positive, got {width!r}")
+
+    return microseconds
+
+
+def source_fingerprint(log_path):
+    """Name, size and mtime of every file a chamber's history is read from
+
+    A new record or a rotation changes it, so it tells whether a cached result is still current.
+    """
+
+    fingerprint = []
+    for path in segment_paths(log_path):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            # Compressed away between listing and stat:
+            continue
+        fingerprint.append([path.name, stat.st_size, stat.st_mtime_ns])
+
+    return json.dumps(fingerprint)
+
+
+def _load_json(log_path):
+    timestamps = []
+    columns = {field: [] for field in NUMERIC_FIELDS}
+    nan = float("nan")
+
+    for record in history.read_records(log_path):
+        if not is_reading(record):
+            continue
+
+        # "2021-09-15T12:42:12.882954Z", NumPy parses it without the Z:
+        timestamps.append(record["timestamp"][:-1])
+        for field, column in columns.items():
+            value = record.get(field)
+            # Missing, or e.g. a reading the controller sent as "----":
+            column.append(value if is_number(value) else nan)
+
+    arrays = {field: numpy.array(column, dtype="f8") for field, column in columns.items()}
+    arrays["timestamp"] = numpy.array(timestamps, dtype="datetime64[us]")
+    return arrays
+
+
+def _load_binary(binary_path):
+    records = binary_log.read_array(binary_path)
+    arrays = {field: records[field].astype("f8") for field in NUMERIC_FIELDS}
+    arrays["timestamp"] = _local_times(records["timestamp"])
+    return arrays
+
+
+def _local_times(epoch_seconds):
+    """Epoch seconds => local datetime64s, the same clock the JSON log timestamps are written in"""
+
+    microseconds = numpy.round(epoch_seconds * 1_000_000).astype("i8")
+    # The UTC offset only changes on the hour, so it's looked up once per distinct hour:
+    hours, inverse = numpy.unique(microseconds // 3_600_000_000, return_inverse=True)
+    offsets = numpy.array(
+        [
+            datetime.fromtimestamp(hour * 3600).astimezone().utcoffset().total_seconds()
+            for hour in hours.tolist()
+        ]
+    )
+    local = microseconds + numpy.round(offsets * 1_000_000).astype("i8")[inverse.ravel()]
+    return local.astype("datetime64[us]")
+
+
+def _cache_path(log_dir_path, chamber_id, name):
+    return Path(log_dir_path) / CACHE_DIR_NAME / f"chamber_{chamber_id}.{name}.npz"
+
+
+def _read_cache(path, fingerprint):
+    try:
+        with numpy.load(path, allow_pickle=False) as cached:
+            if str(cached["__fingerprint__"]) != fingerprint:
+                return None
+            return {key: cached[key] for key in cached.files if key != "__fingerprint__"}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _write_cache(path, fingerprint, arrays):
+    path.parent.mkdir(exist_ok=True)
+    # Written next to the cache and renamed over it, so readers never see half a file:
+    part = path.with_name(path.name + ".part.npz")
+    numpy.savez(part, __fingerprint__=numpy.array(fingerprint), **arrays)
+    part.replace(path)
+
+
+def load_columns(log_dir_path, chamber_id, source="json", use_cache=True):
+    """Loads a chamber's readings as a dict of NumPy columns, "timestamp" plus NUMERIC_FIELDS
+
+    `source` is "json" for the JSON-lines logs or "binary" for the binary logs written with
+    `binary_log: true`. Missing values are NaN. Readings are in time order.
+    """
+
+    _require_numpy()
+
+    if source == "json":
+        source_path = history.log_path_for(log_dir_path, chamber_id)
+        fingerprint = source_fingerprint(source_path)
+    elif source == "binary":
+        source_path = binary_log.binary_path_for(log_dir_path, chamber_id)
+        stat = source_path.stat()
+        fingerprint = json.dumps([[source_path.name, stat.st_size, stat.st_mtime_ns]])
+    else:
+        raise ValueError(f"unknown source {source!r}")
+
+    cache_path = _cache_path(log_dir_path, chamber_id, f"columns-{source}-v{CACHE_VERSION}")
+    if use_cache:
+        cached = _read_cache(cache_path, fingerprint)
+        if cached is not None:
+            return cached
+
+    if source == "json":
+        arrays = _load_json(source_path)
+    else:
+        arrays = _load_binary(source_path)
+
+    if use_cache:
+        _write_cache(cache_path, fingerprint, arrays)
+
+    return arrays
+
+
+def rollup_columns(columns, width):
+    """Buckets a dict of columns (as returned by load_columns) into `width` wide time buckets
+
+    Returns a dict with "start" (the start of each non-empty bucket), "count" (readings in it) and
+    "<field>_min", "<field>_mean" and "<field>_max" for every numeric field. NaNs are ignored; a
+    field with no values in a bucket gets NaN.
+    """
+
+    _require_numpy()
+
+    width = parse_width(width)
+    timestamps = columns["timestamp"].astype("datetime64[us]").astype("i8")
+    buckets = timestamps // width
+
+    if len(buckets) == 0:
+        result = {"start": numpy.empty(0, dtype="datetime64[us]"), "count": numpy.empty(0, "i8")}
+        for field in NUMERIC_FIELDS:
+            for aggregate in AGGREGATES:
+                result[f"{field}_{aggregate}"] = numpy.empty(0, dtype="f8")
+        return result
+
+    # Readings are in time order, so each bucket is one contiguous run:
+    starts = numpy.flatnonzero(numpy.diff(buckets, prepend=buckets[0] - 1))
+    result = {
+        "start": (buckets[starts] * width).astype("datetime64[us]"),
+        "count": numpy.diff(numpy.append(starts, len(buckets))),
+    }
+
+    # All fields at once, as the rows of one (fields x readings) matrix:
+    values = numpy.vstack([columns[field] for field in NUMERIC_FIELDS]).astype("f8")
+    missing = numpy.isnan(values)
+
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        counts = numpy.add.reduceat((~missing).astype("i8"), starts, axis=1)
+        sums = numpy.add.reduceat(numpy.where(missing, 0.0, values), starts, axis=1)
+        # fmin/fmax skip NaNs unless a bucket has nothing else:
+        minimums = numpy.fmin.reduceat(values, starts, axis=1)
+        maximums = numpy.fmax.reduceat(values, starts, axis=1)
+        means = sums / counts
+
+    for row, field in enumerate(NUMERIC_FIELDS):
+        result[f"{field}_min"] = minimums[row]
+        result[f"{field}_mean"] = means[row]
+        result[f"{field}_max"] = maximums[row]
+
+    return result
+
+
+def rollup(log_dir_path, chamber_id, width, start=None, end=None, source="json", use_cache=True):
+    """The rollup_columns() of a chamber's whole history, cached until its logs change
+
+    `start` and `end` (datetimes) limit the buckets returned, not what is cached.
+    """
+
+    _require_numpy()
+
+    width_us = parse_width(width)
+    columns = load_columns(log_dir_path, chamber_id, source=source, use_cache=use_cache)
+    # The columns cache's fingerprint already tracks the source files, a rollup is current as long
+    # as it was computed from the same number of readings at the same last timestamp:
+    fingerprint = json.dumps(
+        [len(columns["timestamp"]), str(columns["timestamp"][-1:]), width_us]
+    )
+    cache_path = _cache_path(
+        log_dir_path, chamber_id, f"rollup-{source}-{width_us}us-v{CACHE_VERSION}"
+    )
+
+    result = _read_cache(cache_path, fingerprint) if use_cache else None
+    if result is None:
+        result = rollup_columns(columns, width)
+        if use_cache:
+            _write_cache(cache_path, fingerprint, result)
+
+    if start is not None or end is not None:
+        keep = numpy.ones(len(result["start"]), dtype=bool)
+        if start is not None:
+            keep &= result["start"] >= numpy.datetime64(start, "us")
+        if end is not None:
+            keep &= result["start"] < numpy.datetime64(end, "us")
+        result = {key: column[keep] for key, column in result.items()}
+
+    return result
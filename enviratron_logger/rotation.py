@@ -0,0 +1,263 @@
+"""
+Size and/or time based rotation of the chamber log files, with background compression
+
+The active file keeps its usual name (chamber_1_environment.log). When it rotates it is renamed
+after the timestamp of its first record,
+
+    chamber_1_environment.20210915T124212.log
+
+and then compressed on a background thread to chamber_1_environment.20210915T124212.log.gz (or
+.log.zst). Because segment names sort chronologically, a history reader can pick out the
+segments covering a time range from the file names alone, see segment_paths().
+"""
+
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+rotation_logger = logging.getLogger("enviratron_rotation")
+
+SEGMENT_TIME_FORMAT = "%Y%m%dT%H%M%S"
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst", None: ""}
+
+# A single background thread does all of the compressing, off the collection and writer threads:
+_compressor = None
+_compressor_lock = threading.Lock()
+
+
+def _get_compressor():
+    global _compressor
+
+    with _compressor_lock:
+        if _compressor is None:
+            _compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-compressor")
+        return _compressor
+
+
+def compress_in_background(path, compression):
+    """Submits compress_segment() to the compressor thread, logging it if it fails
+
+    A segment that fails to compress is left as it is, and tried again by the next handler opened
+    on its log file.
+    """
+
+    future = _get_compressor().submit(compress_segment, path, compression)
+
+    def log_failure(future):
+        error = future.exception()
+        if error is not None:
+            rotation_logger.error(
+                "compressing %s failed, leaving it uncompressed",
+                path,
+                exc_info=(type(error), error, error.__traceback__),
+            )
+
+    future.add_done_callback(log_failure)
+    return future
+
+
+def compress_segment(path, compression):
+    """Compresses a rotated segment next to itself and removes the original"""
+
+    path = Path(path)
+    target = path.with_name(path.name + COMPRESSION_SUFFIXES[compression])
+    partial = target.with_name(target.name + ".part")
+
+    with open(path, "rb") as source:
+        if compression == "gzip":
+            with gzip.open(partial, "wb") as dest:
+                shutil.copyfileobj(source, dest)
+        else:
+            with open(partial, "wb") as dest:
+                zstandard.ZstdCompressor().copy_stream(source, dest)
+
+    # Only replace the plain segment once the compressed one is complete:
+    os.replace(partial, target)
+    path.unlink()
+    return target
+
+
+def segment_paths(log_path):
+    """Returns the rotated segments of a log file (oldest first), followed by the file itself
+
+    Each segment is returned once, compressed or not, whichever exists.
+    """
+
+    log_path = Path(log_path)
+    prefix = log_path.stem + "."
+    segments = {}
+
+    for path in log_path.parent.glob(f"{log_path.stem}.*{log_path.suffix}*"):
+        name = path.name
+
+        if not name.startswith(prefix) or name.endswith(".part"):
+            continue
+
+        segment = name[len(prefix):].split(log_path.suffix, 1)[0]
+        # Prefer the plain file while compression is still in flight:
+        if segment not in segments or path.suffix == log_path.suffix:
+            segments[segment] = path
+
+    paths = [segments[segment] for segment in sorted(segments, key=_segment_sort_key)]
+
+    if log_path.exists():
+        paths.append(log_path)
+
+    return paths
+
+
+def _segment_sort_key(segment):
+    # "20210915T124212-10" has to sort after "20210915T124212-9":
+    start, _, n = segment.partition("-")
+    return start, int(n) if n.isdigit() else 0
+
+
+def segment_start(path):
+    """Returns the start time encoded in a segment's file name, or None for the active file"""
+
+    parts = Path(path).name.split(".")
+
+    try:
+        return datetime.strptime(parts[1].split("-")[0], SEGMENT_TIME_FORMAT)
+    except (IndexError, ValueError):
+        return None
+
+
+def open_segment(path, binary=False):
+    """Opens a segment for reading text (or bytes), whatever it is compressed with"""
+
+    path = Path(path)
+
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb" if binary else "rt")
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(f"reading {path} requires the zstandard package")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+        return io.BufferedReader(reader) if binary else io.TextIOWrapper(reader)
+
+    try:
+        return open(path, "rb" if binary else "r")
+    except FileNotFoundError:
+        # Compressed (and removed) since it was listed:
+        for suffix in COMPRESSION_SUFFIXES.values():
+            compressed = path.with_name(path.name + suffix)
+            if suffix and compressed.exists():
+                return open_segment(compressed, binary=binary)
+        raise
+
+
+class RotatingChamberFileHandler(logging.FileHandler):
+    """A FileHandler that rotates by size and/or at local midnight
+
+    `max_bytes` of 0 and `when` of None disable the respective rotation. `compression` is "gzip",
+    "zstd" (needs the zstandard package) or None.
+    """
+
+    def __init__(self, filename, max_bytes=0, when=None, compression="gzip", encoding=None):
+        if when not in (None, "daily"):
+            raise ValueError(f"when must be 'daily' or None, not {when!r}")
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"compression must be one of {tuple(COMPRESSION_SUFFIXES)}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+
+        super(RotatingChamberFileHandler, self).__init__(filename, mode="a", encoding=encoding)
+        self.max_bytes = max_bytes
+        self.when = when
+        self.compression = compression
+        self.__segment_start = self.__first_record_time()
+        self.__next_rollover = self.__compute_next_rollover(time.time())
+
+        # Finish compressing anything an earlier process rotated but didn't get to compress:
+        if compression is not None:
+            for path in segment_paths(self.baseFilename)[:-1]:
+                if path.suffix == Path(self.baseFilename).suffix:
+                    compress_in_background(path, compression)
+
+    def __first_record_time(self):
+        """The time of the first record already in the active file, if there is one"""
+
+        try:
+            with open(self.baseFilename, "r") as log_file:
+                first_line = log_file.readline()
+            timestamp = json.loads(first_line)["timestamp"]
+            return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ").timestamp()
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def __compute_next_rollover(self, now):
+        if self.when != "daily":
+            return None
+
+        tomorrow = datetime.fromtimestamp(now).date() + timedelta(days=1)
+        return datetime(tomorrow.year, tomorrow.month, tomorrow.day).timestamp()
+
+    def should_rollover(self, record):
+        if self.__next_rollover is not None and record.created >= self.__next_rollover:
+            return True
+
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() >= self.max_bytes:
+                return True
+
+        return False
+
+    def __segment_path(self):
+        start = self.__segment_start or time.time()
+        base = Path(self.baseFilename)
+        stem = f"{base.stem}.{datetime.fromtimestamp(start).strftime(SEGMENT_TIME_FORMAT)}"
+        path = base.with_name(stem + base.suffix)
+        n = 0
+
+        # Two size based rotations within the same second:
+        while path.exists() or path.with_name(
+            path.name + COMPRESSION_SUFFIXES[self.compression]
+        ).exists():
+            n += 1
+            path = base.with_name(f"{stem}-{n}{base.suffix}")
+
+        return path
+
+    def do_rollover(self, record):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            segment = self.__segment_path()
+            os.replace(self.baseFilename, segment)
+
+            if self.compression is not None:
+                compress_in_background(segment, self.compression)
+
+        self.__segment_start = None
+        self.__next_rollover = self.__compute_next_rollover(record.created)
+
+    def emit(self, record):
+        try:
+            if self.should_rollover(record):
+                self.do_rollover(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        if self.__segment_start is None:
+            self.__segment_start = record.created
+
+        super(RotatingChamberFileHandler, self).emit(record)
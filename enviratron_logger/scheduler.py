@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from chamber import GrowthChamberControl as gcc
+from collector import DEFAULT_ATTEMPTS, DEFAULT_MAX_CONCURRENCY, read_state
+from tiers import TieredReader
+
+scheduler_logger = logging.getLogger("enviratron_scheduler")
+
+
+def next_deadline(now, interval, offset=0.0):
+    """Returns the first wall-clock time after `now` that falls on the interval grid
+
+    The grid is anchored to the epoch, so with a 10 second interval and no offset samples are taken
+    at :00, :10, :20 and so on, no matter when the process was started.
+    """
+    ticks = math.floor((now - offset) / interval) + 1
+    return ticks * interval + offset
+
+
+def build_schedule(chamber_ids, interval, chamber_intervals=None):
+    """Returns a list of (chamber_id, interval, offset) tuples
+
+    Each chamber gets its own phase offset within its interval so that the requests to the
+    different controllers are spread out instead of all hitting the network at the same moment.
+    `chamber_intervals` is an optional chamber_id => interval dict of per-chamber overrides.
+    """
+
+    chamber_intervals = chamber_intervals or {}
+    chamber_ids = list(chamber_ids)
+    schedule = []
+
+    for i, chamber_id in enumerate(chamber_ids):
+        chamber_interval = float(chamber_intervals.get(chamber_id, interval))
+        offset = chamber_interval * i / len(chamber_ids)
+        schedule.append((chamber_id, chamber_interval, offset))
+
+    return schedule
+
+
+async def _run_chamber(
+    chamber_id, interval, offset, handle_state, loop, executor, breaker, attempts, slow_interval
+):
+    """Reads one chamber on its own grid of deadlines, forever"""
+
+    chamber = gcc(chamber_id)
+    if slow_interval:
+        chamber = TieredReader(chamber, slow_interval)
+    read = partial(read_state, chamber, breaker, attempts)
+    deadline = next_deadline(time.time(), interval, offset)
+
+    while True:
+        await asyncio.sleep(max(0.0, deadline - time.time()))
+
+        # A failure handling one reading must not take down the other chambers' loops, which
+        # share the gather() in run_schedule():
+        try:
+            state = await loop.run_in_executor(executor, read)
+            handle_state(chamber_id, state)
+        except Exception:
+            scheduler_logger.exception("chamber %s: tick failed", chamber_id)
+
+        # If the read overran one or more ticks, skip them rather than firing a burst to catch up:
+        expected = deadline + interval
+        deadline = next_deadline(max(time.time(), deadline), interval, offset)
+
+        if deadline > expected:
+            skipped = round((deadline - expected) / interval)
+            scheduler_logger.warning(
+                "chamber %s overran its %ss interval, skipped %s tick(s)", chamber_id, interval, skipped
+            )
+
+
+async def run_schedule(
+    schedule,
+    handle_state,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    breakers=None,
+    attempts=DEFAULT_ATTEMPTS,
+    slow_intervals=None,
+):
+    """Runs every (chamber_id, interval, offset) entry in `schedule` until cancelled
+
+    `handle_state` is called with (chamber_id, state) after each read. `breakers` is an optional
+    chamber_id => CircuitBreaker dict. `slow_intervals` is an optional chamber_id => seconds dict,
+    chambers in it only read their slow-changing tags that often (see tiers.TieredReader).
+    """
+
+    loop = asyncio.get_running_loop()
+    breakers = breakers or {}
+    slow_intervals = slow_intervals or {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        await asyncio.gather(
+            *(
+                _run_chamber(
+                    chamber_id,
+                    interval,
+                    offset,
+                    handle_state,
+                    loop,
+                    executor,
+                    breakers.get(chamber_id),
+                    attempts,
+                    slow_intervals.get(chamber_id),
+                )
+                for chamber_id, interval, offset in schedule
+            )
+        )
+
+
+def run(
+    schedule,
+    handle_state,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    breakers=None,
+    attempts=DEFAULT_ATTEMPTS,
+    slow_intervals=None,
+):
+    """Synchronous entry point for run_schedule()"""
+    asyncio.run(
+        run_schedule(
+            schedule,
+            handle_state,
+            max_concurrency=max_concurrency,
+            breakers=breakers,
+            attempts=attempts,
+            slow_intervals=slow_intervals,
+        )
+    )
@@ -8,12 +8,18 @@ setup(
     author_email='scott@zarecor.com',
     description='A module for logging plant growth chamber conditions for the Enviratron project.',
     #packages=find_packages(),
-    py_modules=["enviratron_logger", "chamber"],
+    py_modules=["enviratron_logger", "chamber", "collector", "scheduler", "breaker", "emulator", "log_writer", "rotation", "deadband", "history", "sqlite_sink", "binary_log", "rollup", "aggregates", "follower", "state_api", "coalescer", "ratelimit", "tiers", "records"],
     entry_points={
         'console_scripts': [
-            'enviratronlogger=enviratron_logger:main'
+            'enviratronlogger=enviratron_logger:main',
+            'enviratronhistory=history:main'
         ]
     },
     #install_requires=['numpy >= 1.11.1', 'matplotlib >= 1.5.1'],
     install_requires=['lxml >= 3.8.0', 'python-json-logger', 'requests', 'PyYAML'],
+    extras_require={
+        'fast': ['orjson'],
+        'zstd': ['zstandard'],
+        'numpy': ['numpy'],
+    },
 )
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""
+SQLite storage for chamber readings
+
+An optional second sink next to the JSON-lines logs. Each reading becomes one row of a typed
+`readings` table indexed by (chamber_id, timestamp), and error records go to an `errors` table, so a
+range query over months of one chamber's data is an index seek instead of a scan of every log file:
+
+    sink = SQLiteSink("chambers.sqlite3")
+    sink.write_cycle(collect([1, 2, 3]))
+    rows = sink.query(1, start=datetime(2021, 9, 1), end=datetime(2021, 10, 1))
+
+The database runs in WAL mode, so readers never block the writer, and rows are inserted in one
+transaction per collection cycle rather than one per reading.
+"""
+
+import json
+import sqlite3
+
+from records import DEFAULT_MAX_DELAY, BufferedSink, as_logged, is_reading
+
+# Column name => SQLite type for everything GrowthChamberControl.get_state() returns. Anything
+# else a controller sends ends up in the `extra` column as JSON:
+READING_COLUMNS = (
+    ("co2_actual", "REAL"),
+    ("co2_target", "REAL"),
+    ("humidity_actual", "REAL"),
+    ("humidity_target", "REAL"),
+    ("humidification_enabled", "INTEGER"),
+    ("dehumidification_enabled", "INTEGER"),
+    *((f"lighting_{i}", "REAL") for i in range(1, 8)),
+    ("temperature_actual", "REAL"),
+    ("temperature_target", "REAL"),
+    ("watering_actual", "REAL"),
+    ("watering_target", "REAL"),
+    ("air_diverter_state", "INTEGER"),
+    ("door_state", "INTEGER"),
+    ("curtain_state", "INTEGER"),
+    ("operating_mode", "TEXT"),
+    ("hour", "INTEGER"),
+    ("minute", "INTEGER"),
+    ("second", "INTEGER"),
+)
+ERROR_COLUMNS = (
+    ("type", "TEXT"),
+    ("error", "TEXT"),
+    ("elapsed", "REAL"),
+    ("attempts", "INTEGER"),
+)
+
+_READING_NAMES = tuple(name for name, _ in READING_COLUMNS)
+_ERROR_NAMES = tuple(name for name, _ in ERROR_COLUMNS)
+# SQLite has no boolean type, these come back out of their INTEGER columns as True/False:
+_BOOL_COLUMNS = frozenset(
+    name for name, _ in READING_COLUMNS if name.endswith(("_enabled", "_state"))
+)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS readings (
+    chamber_id INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    {", ".join(f"{name} {sql_type}" for name, sql_type in READING_COLUMNS)},
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS readings_chamber_time ON readings (chamber_id, timestamp);
+CREATE TABLE IF NOT EXISTS errors (
+    chamber_id INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    {", ".join(f"{name} {sql_type}" for name, sql_type in ERROR_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS errors_chamber_time ON errors (chamber_id, timestamp);
+"""
+
+_INSERT_READING = (
+    f"INSERT INTO readings (chamber_id, timestamp, {', '.join(_READING_NAMES)}, extra) "
+    f"VALUES ({', '.join('?' * (len(_READING_NAMES) + 3))})"
+)
+_INSERT_ERROR = (
+    f"INSERT INTO errors (chamber_id, timestamp, {', '.join(_ERROR_NAMES)}) "
+    f"VALUES ({', '.join('?' * (len(_ERROR_NAMES) + 2))})"
+)
+
+
+def to_epoch(value):
+    """Turns a datetime into epoch seconds
+
+    Naive datetimes are taken as local time, like the log timestamps (and history.py and
+    aggregates.py), so the same window selects the same readings from every backend.
+    """
+
+    if value is None or isinstance(value, (int, float)):
+        return value
+
+    return value.timestamp()
+
+
+def _reading_row(state, timestamp):
+    # Stored the way the JSON logs have it:
+    values = as_logged(state)
+    chamber_id = values.pop("chamber_id")
+
+    row = [chamber_id, timestamp]
+    row.extend(values.pop(name, None) for name in _READING_NAMES)
+    row.append(json.dumps(values) if values else None)
+    return row
+
+
+def _error_row(state, timestamp):
+    return [state.get("chamber_id"), timestamp, *(state.get(name) for name in _ERROR_NAMES)]
+
+
+class SQLiteSink(BufferedSink):
+    """Stores readings and error records in a SQLite database; a sink, see records.py
+
+    Rows are buffered by add() and written in a single transaction per batch, see BufferedSink.
+    """
+
+    def __init__(self, path, batch_size=0, max_delay=DEFAULT_MAX_DELAY):
+        super(SQLiteSink, self).__init__(batch_size=batch_size, max_delay=max_delay)
+        self.path = str(path)
+        # Rows are written, queried and the database closed from different threads:
+        self.__connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode this is still durable across application crashes, just not power loss:
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.executescript(_SCHEMA)
+        self.__readings = []
+        self.__errors = []
+
+    def _buffer(self, state, timestamp):
+        if is_reading(state):
+            self.__readings.append(_reading_row(state, timestamp))
+        else:
+            self.__errors.append(_error_row(state, timestamp))
+
+    def _write(self):
+        if not self.__readings and not self.__errors:
+            return
+
+        with self.__connection:
+            self.__connection.executemany(_INSERT_READING, self.__readings)
+            self.__connection.executemany(_INSERT_ERROR, self.__errors)
+
+        self.__readings = []
+        self.__errors = []
+
+    def _close(self):
+        self.__connection.close()
+
+    def query(self, chamber_id, start=None, end=None, table="readings"):
+        """Returns the rows of one chamber with start <= timestamp < end as dicts, oldest first
+
+        `start` and `end` are datetimes or epoch seconds. Timestamps come back as epoch seconds.
+        """
+
+        if table not in ("readings", "errors"):
+            raise ValueError(f"unknown table {table!r}")
+
+        sql = f"SELECT * FROM {table} WHERE chamber_id = ?"
+        params = [chamber_id]
+
+        if start is not None:
+            sql += " AND timestamp >= ?"
+            params.append(to_epoch(start))
+        if end is not None:
+            sql += " AND timestamp < ?"
+            params.append(to_epoch(end))
+
+        sql += " ORDER BY timestamp"
+
+        with self._lock:
+            cursor = self.__connection.execute(sql, params)
+            names = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+
+        records = []
+        for row in rows:
+            record = {name: value for name, value in zip(names, row) if value is not None}
+            for name in _BOOL_COLUMNS.intersection(record):
+                record[name] = bool(record[name])
+            extra = record.pop("extra", None)
+            if extra:
+                record.update(json.loads(extra))
+            records.append(record)
+
+        return records
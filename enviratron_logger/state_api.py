@@ -0,0 +1,182 @@
+"""
+Local latest-state HTTP API
+
+The Percival controllers are slow embedded web servers that degrade when several clients poll them
+at once, so instead of every lab tool reading them itself the daemon serves what it last collected
+from memory:
+
+    GET /states      {"1": {...}, "2": {...}, ...} for every chamber
+    GET /states/1    {"chamber_id": 1, "age": 12.503, "collected_at": "2021-09-15T12:42:12.882954Z",
+                      "state": {...}, "last_error": null}
+
+`state` is the latest successful reading, as it is logged (lighting on the 0-100 scale). `age` is
+the number of seconds since it was collected. `last_error` is the error record of the latest read
+if that read failed, otherwise null. Everything but the age is encoded once per reading, so a
+request only costs a dict lookup and a write.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from records import as_logged, is_reading
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+class LatestStates:
+    """The latest reading (and error) of every chamber, pre-encoded for serving; a sink, see
+    records.py
+    """
+
+    def __init__(self):
+        # chamber_id => (collected_at, encoded body fields):
+        self.__entries = {}
+        self.__latest = {}
+        self.__lock = threading.Lock()
+
+    def add(self, state, timestamp=None):
+        """Records a reading or error record collected at `timestamp` (epoch seconds, default now)"""
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        chamber_id = state.get("chamber_id")
+
+        with self.__lock:
+            reading, collected_at, _ = self.__latest.get(chamber_id, (None, None, None))
+
+            if is_reading(state):
+                reading, collected_at, error = as_logged(state), timestamp, None
+            else:
+                error = state
+
+            self.__latest[chamber_id] = (reading, collected_at, error)
+            self.__entries[chamber_id] = (collected_at, self.__encode(reading, collected_at, error))
+
+    def write_cycle(self, states, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+
+        for state in states.values():
+            self.add(state, timestamp)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def __encode(reading, collected_at, error):
+        if collected_at is None:
+            collected = "null"
+        else:
+            collected = json.dumps(
+                datetime.fromtimestamp(collected_at).strftime(_TIMESTAMP_FORMAT)
+            )
+
+        return (
+            f'"collected_at": {collected}, "state": {json.dumps(reading)}, '
+            f'"last_error": {json.dumps(error)}}}'
+        ).encode("utf-8")
+
+    def encoded(self, chamber_id, now=None):
+        """The JSON body for one chamber, or None if nothing was collected from it yet"""
+
+        entry = self.__entries.get(chamber_id)
+        if entry is None:
+            return None
+
+        collected_at, body = entry
+        age = "null" if collected_at is None else "%.3f" % ((now or time.time()) - collected_at)
+        return b'{"chamber_id": %s, "age": %s, ' % (
+            json.dumps(chamber_id).encode("ascii"),
+            age.encode("ascii"),
+        ) + body
+
+    def encoded_all(self, now=None):
+        now = now or time.time()
+        parts = [
+            b'"%s": %s' % (str(chamber_id).encode("utf-8"), self.encoded(chamber_id, now))
+            for chamber_id in list(self.__entries)
+        ]
+        return b"{" + b", ".join(parts) + b"}"
+
+    def latest(self, chamber_id):
+        """(reading as logged, collected_at epoch seconds, last error record) for one chamber"""
+        return self.__latest.get(chamber_id, (None, None, None))
+
+
+class StateRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so polling tools don't pay for a new connection each time:
+    protocol_version = "HTTP/1.1"
+    # The headers and body are separate writes, without this every response waits on a delayed ACK:
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        states = self.server.states
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+
+        if parts == ["states"]:
+            body = states.encoded_all()
+        elif len(parts) == 2 and parts[0] == "states":
+            try:
+                chamber_id = int(parts[1])
+            except ValueError:
+                chamber_id = parts[1]
+            body = states.encoded(chamber_id)
+        else:
+            body = None
+
+        if body is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StateServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class StateAPI:
+    """Serves a LatestStates over HTTP on a background thread"""
+
+    def __init__(self, states, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.states = states
+        self.server = StateServer((host, port), StateRequestHandler)
+        self.server.states = states
+        self.__thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
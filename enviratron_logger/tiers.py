@@ -0,0 +1,54 @@
+import time
+
+from records import NOT_LOGGED_KEYS, is_reading
+
+# Seconds between full reads when tiered polling is on; 0 reads every tag every time:
+DEFAULT_SLOW_INTERVAL = 0.0
+
+# Kept from the last full read rather than taken from the fast one:
+_META_KEYS = ("chamber_id", *NOT_LOGGED_KEYS)
+
+
+class TieredReader:
+    """Reads a chamber's fast-changing tags every time and the rest every `slow_interval` seconds
+
+    Drop-in for a GrowthChamberControl as far as read_state() is concerned. The first read and any
+    read at least `slow_interval` seconds after the last full one reads every tag (get_state());
+    the ones in between only read the FAST_STATE_TAGS (get_fast_state()) and fill in the rest from
+    the last full reading, so every state it returns is complete and in the usual key order.
+    """
+
+    def __init__(self, chamber, slow_interval=DEFAULT_SLOW_INTERVAL, clock=time.monotonic):
+        self.chamber = chamber
+        self.chamber_id = chamber.chamber_id
+        self.slow_interval = slow_interval
+        self.__clock = clock
+        self.__last_full = None
+        self.__last_full_at = None
+
+    def __full_read_due(self, now):
+        return self.__last_full is None or now - self.__last_full_at >= self.slow_interval
+
+    def get_state(self):
+        now = self.__clock()
+
+        if self.__full_read_due(now):
+            state = self.chamber.get_state()
+
+            if is_reading(state):
+                self.__last_full = state
+                self.__last_full_at = now
+
+            return state
+
+        fast = self.chamber.get_fast_state()
+
+        if not is_reading(fast):
+            return fast
+
+        state = dict(self.__last_full)
+        for key, value in fast.items():
+            if key not in _META_KEYS:
+                state[key] = value
+
+        return state
@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The package is a set of flat modules, imported the way enviratron_logger.py imports them:
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "enviratron_logger"))
+
+from chamber import GrowthChamberControl as gcc
+from emulator import EmulatorSettings, PercivalEmulator
+
+
+@pytest.fixture
+def emulator_settings():
+    """Override in a test module for latency or faults"""
+    return EmulatorSettings(seed=1)
+
+
+@pytest.fixture
+def emulator(emulator_settings):
+    """A running emulator that GrowthChamberControl talks to for the duration of a test"""
+
+    base_url = gcc.BASE_URL
+    with PercivalEmulator(settings=emulator_settings) as emu:
+        gcc.BASE_URL = emu.base_url
+        try:
+            yield emu
+        finally:
+            gcc.BASE_URL = base_url
+
+
+class FakeClock:
+    """A monotonic clock that only moves when a test sets `now`"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import pytest
+
+from aggregates import AggregateSink
+
+# 2021-09-15 12:00:30 local time:
+NOON = datetime(2021, 9, 15, 12, 0, 30).timestamp()
+
+
+@pytest.fixture
+def sink(tmp_path):
+    sink = AggregateSink(tmp_path / "aggregates.sqlite3")
+    yield sink
+    sink.close()
+
+
+def test_buckets_hold_count_mean_and_stddev(sink):
+    for offset, temperature in enumerate((20.0, 22.0, 24.0)):
+        sink.add({"chamber_id": 1, "temperature_actual": temperature}, NOON + offset)
+    sink.flush()
+
+    (minute,) = sink.query(1, "temperature_actual", "1m", start=datetime(2021, 9, 15, 12))
+    assert minute["start"] == datetime(2021, 9, 15, 12, 0)
+    assert minute["count"] == 3
+    assert (minute["min"], minute["mean"], minute["max"]) == (20.0, 22.0, 24.0)
+    assert minute["stddev"] == pytest.approx((8 / 3) ** 0.5)
+
+    (day,) = sink.query(1, "temperature_actual", "1d")
+    assert day["start"] == datetime(2021, 9, 15)
+
+
+def test_non_numeric_values_and_error_records_are_skipped(sink):
+    sink.add({"chamber_id": 1, "temperature_actual": "----", "co2_actual": float("nan")}, NOON)
+    sink.add({"chamber_id": 1, "temperature_actual": 21.0, "door_state": True}, NOON + 1)
+    sink.add({"chamber_id": 1, "type": "ConnectionError", "error": ""}, NOON + 2)
+    sink.flush()
+
+    assert [row["count"] for row in sink.query(1, "temperature_actual", "1m")] == [1]
+    assert sink.query(1, "co2_actual", "1m") == []
+
+
+def test_error_records_count_towards_the_batch(tmp_path):
+    sink = AggregateSink(tmp_path / "aggregates.sqlite3", batch_size=3, max_delay=3600)
+
+    sink.add({"chamber_id": 1, "temperature_actual": 21.0}, NOON)
+    sink.add({"chamber_id": 2, "type": "ConnectionError", "error": ""}, NOON)
+    assert sink.query(1, "temperature_actual", "1m") == []
+
+    sink.add({"chamber_id": 3, "type": "ConnectionError", "error": ""}, NOON)
+    assert len(sink.query(1, "temperature_actual", "1m")) == 1
+    sink.close()
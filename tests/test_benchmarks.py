@@ -0,0 +1,22 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BENCHMARKS = Path(__file__).resolve().parent.parent / "benchmarks"
+
+
+def test_fleet_benchmark_smoke(tmp_path):
+    output = tmp_path / "fleet.json"
+    subprocess.run(
+        [sys.executable, str(BENCHMARKS / "bench_fleet.py"), "--sizes", "3", "--cycles", "1",
+         "--latency", "0", "--output", str(output)],
+        check=True,
+        capture_output=True,
+        timeout=60,
+    )
+
+    (result,) = json.loads(output.read_text())["results"]
+    assert result["chambers"] == 3
+    assert result["errors"] == 0
+    assert set(result["cpu_per_cycle_s"]) == {"parse", "format", "write"}
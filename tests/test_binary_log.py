@@ -0,0 +1,83 @@
+import math
+
+import pytest
+
+import binary_log
+from binary_log import BinarySink, iter_records, pack, unpack
+
+READING = {
+    "co2_actual": 502.0,
+    "chamber_id": 3,
+    "env_var": "operating",
+    "env_val": "Manual",
+    "co2_target": 500.0,
+    "humidity_actual": 72.0,
+    "humidity_target": 74.0,
+    "humidification_enabled": True,
+    "dehumidification_enabled": False,
+    **{f"lighting_{i}": 10000 for i in range(1, 8)},
+    "temperature_actual": 26.0,
+    "temperature_target": 26.0,
+    "air_diverter_state": False,
+    "watering_actual": 98.0,
+    "watering_target": 0.0,
+    "door_state": True,
+    "curtain_state": False,
+    "operating_mode": "Manual",
+}
+
+
+def test_pack_unpack_round_trip():
+    state = unpack(pack(READING, 1631709732.5))
+
+    assert state["timestamp"] == 1631709732.5
+    assert state["lighting_1"] == 100.0
+    for key, value in READING.items():
+        if key.startswith("lighting_") or key.startswith("env_"):
+            continue
+        assert state[key] == value, key
+
+
+def test_missing_and_non_numeric_values_are_nan():
+    state = unpack(pack({"chamber_id": 1, "co2_actual": "----", "humidity_actual": 71.0}, 0.0))
+
+    assert "co2_actual" not in state
+    assert "door_state" not in state and "operating_mode" not in state
+    assert state["humidity_actual"] == 71.0
+
+
+def test_unknown_modes_are_kept_as_unknown(caplog):
+    with caplog.at_level("WARNING", logger="enviratron_binary_log"):
+        record = pack({"chamber_id": 1, "operating_mode": "Holiday"}, 0.0)
+        pack({"chamber_id": 1, "operating_mode": "Holiday"}, 0.0)
+
+    assert unpack(record)["operating_mode"] == binary_log.UNKNOWN_MODE_NAME
+    assert len([r for r in caplog.records if "Holiday" in r.getMessage()]) == 1
+
+
+def test_sink_appends_readings_and_skips_errors(tmp_path):
+    sink = BinarySink(tmp_path)
+    sink.add(READING, 10.0)
+    sink.write_cycle(
+        {3: {"chamber_id": 3, "type": "ConnectionError"}, 4: dict(READING, chamber_id=4)}, 20.0
+    )
+    sink.add(dict(READING, temperature_actual="----"), 30.0)
+    sink.close()
+
+    records = list(iter_records(binary_log.binary_path_for(tmp_path, 3)))
+    assert [r["timestamp"] for r in records] == [10.0, 30.0]
+    assert "temperature_actual" not in records[1]
+    assert len(list(iter_records(binary_log.binary_path_for(tmp_path, 4)))) == 1
+
+
+def test_read_array_views_the_file(tmp_path):
+    numpy = pytest.importorskip("numpy")
+    sink = BinarySink(tmp_path)
+    for i in range(5):
+        sink.add(dict(READING, temperature_actual=20.0 + i), float(i))
+    sink.close()
+
+    readings = binary_log.read_array(binary_log.binary_path_for(tmp_path, 3))
+    assert len(readings) == 5
+    assert numpy.allclose(readings["temperature_actual"], [20, 21, 22, 23, 24])
+    assert math.isclose(readings["lighting_7"][0], 100.0)
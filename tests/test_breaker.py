@@ -0,0 +1,74 @@
+import pytest
+
+from breaker import CircuitBreaker, load_breakers, save_breakers
+
+
+def test_opens_after_threshold_and_backs_off(clock):
+    breaker = CircuitBreaker("chamber 1", failure_threshold=2, base_backoff=10, max_backoff=25,
+                             clock=clock)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    # One probe after the backoff; it fails, so the next wait doubles:
+    clock.now = 10
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.next_probe == 30
+
+    # Capped at max_backoff:
+    clock.now = 30
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.next_probe == 55
+
+
+def test_successful_probe_closes_and_resets(clock):
+    breaker = CircuitBreaker("chamber 1", failure_threshold=1, base_backoff=10, clock=clock)
+
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow_request()
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+    assert breaker.backoff == 10
+    assert breaker.allow_request()
+
+
+def test_state_carries_over_to_the_next_run(tmp_path, clock):
+    path = tmp_path / ".circuit_breakers.json"
+    clock.now = 100
+    breaker = CircuitBreaker("chamber 1", failure_threshold=1, base_backoff=10, clock=clock)
+    breaker.record_failure()
+    save_breakers(path, {1: breaker, 2: CircuitBreaker("chamber 2", clock=clock)})
+
+    # The next (cron) run has a monotonic clock of its own:
+    next_clock = type(clock)()
+    next_clock.now = 5000
+    restored = CircuitBreaker("chamber 1", failure_threshold=1, base_backoff=10, clock=next_clock)
+    load_breakers(path, {1: restored})
+
+    assert restored.state == CircuitBreaker.OPEN
+    assert restored.failures == 1
+    assert restored.next_probe == pytest.approx(5010, abs=1)
+    assert not restored.allow_request()
+    next_clock.now = 5011
+    assert restored.allow_request()
+
+
+def test_missing_or_broken_state_is_ignored(tmp_path, clock):
+    breaker = CircuitBreaker("chamber 1", clock=clock)
+
+    load_breakers(tmp_path / "missing.json", {1: breaker})
+    (tmp_path / "broken.json").write_text("{")
+    load_breakers(tmp_path / "broken.json", {1: breaker})
+
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
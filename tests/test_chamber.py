@@ -0,0 +1,55 @@
+from urllib.parse import parse_qsl, urlsplit
+
+from chamber import GrowthChamberControl as gcc
+
+
+def test_instances_share_one_session_per_chamber(emulator):
+    first, second, other = gcc(1), gcc(1), gcc(2)
+
+    assert first._GrowthChamberControl__session is second._GrowthChamberControl__session
+    assert first._GrowthChamberControl__session is not other._GrowthChamberControl__session
+
+
+def test_get_state_decodes_every_tag(emulator):
+    state = gcc(1).get_state()
+
+    assert list(state) == ["co2_actual", "chamber_id", "env_var", "env_val", *gcc.STATE_TAGS[1:]]
+    assert state["chamber_id"] == 1
+    assert state["co2_target"] == 500.0
+    assert state["lighting_1"] == 10000
+    assert state["humidification_enabled"] is True
+    assert state["door_state"] is False
+    assert state["operating_mode"] == "Manual"
+    assert (state["env_var"], state["env_val"]) == ("operating", "Manual")
+
+
+def test_reads_go_through_the_limiter_when_configured(emulator, monkeypatch):
+    monkeypatch.setattr(gcc, "RATE_LIMIT", None)
+    assert gcc(1)._GrowthChamberControl__limiter is None
+
+    gcc.configure_limits(rate=0, max_in_flight=1)
+    chamber = gcc(1)
+    limiter = chamber._GrowthChamberControl__limiter
+
+    assert chamber.get_co2()["co2_target"] == 500.0
+    assert limiter.in_flight == 0
+    assert gcc(1)._GrowthChamberControl__limiter is limiter
+
+
+def test_read_plans_are_compiled_once(emulator):
+    chamber = gcc(1)
+    get_plan = chamber._GrowthChamberControl__get_read_plan
+
+    plan = get_plan(["co2_actual", "co2_target", "co2_actual", "no_such_tag"])
+
+    assert get_plan(["co2_actual", "co2_target", "co2_actual", "no_such_tag"]) is plan
+    assert plan.tags == ("co2_actual", "co2_target", "no_such_tag")
+    assert parse_qsl(urlsplit(plan.url).query) == [
+        ("Cmd", "read"),
+        ("Tag", "PV_3"),
+        ("Tag", "CM_SP_3_Manual"),
+    ]
+    # Another controller gets its own plan:
+    assert gcc(2)._GrowthChamberControl__get_read_plan(["co2_actual"]).url.startswith(
+        gcc(2).base_url
+    )
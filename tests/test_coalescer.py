@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from chamber import GrowthChamberControl as gcc
+from coalescer import ReadCoalescer
+from emulator import EmulatorSettings
+
+
+def test_concurrent_reads_share_the_queued_request():
+    coalescer = ReadCoalescer()
+    release = threading.Event()
+    sent = []
+
+    def fetch(tags):
+        sent.append(list(tags))
+        if len(sent) == 1:
+            release.wait(5)
+        return len(sent)
+
+    results = {}
+
+    def read(name, tags):
+        results[name] = coalescer.read(tags, fetch)
+
+    first = threading.Thread(target=read, args=("first", ["a"]))
+    first.start()
+    while not sent:
+        time.sleep(0.001)
+
+    others = [threading.Thread(target=read, args=(name, tags)) for name, tags in
+              (("second", ["a"]), ("third", ["b"]), ("fourth", ["a", "c"]))]
+    for thread in others:
+        thread.start()
+    while coalescer.reads < 4:
+        time.sleep(0.001)
+    release.set()
+
+    for thread in [first] + others:
+        thread.join(5)
+
+    assert sent == [["a"], ["a", "b", "c"]]
+    assert results["first"] == (1, ["a"])
+    # Even though the first request asked for the same tag, it was sent before the read began:
+    assert results["second"] == (2, ["a", "b", "c"])
+    assert results["third"] == results["fourth"] == results["second"]
+    assert coalescer.requests == 2
+
+
+def test_fetch_errors_are_raised_in_every_caller():
+    coalescer = ReadCoalescer()
+
+    def fetch(tags):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        coalescer.read(["a"], fetch)
+
+
+@pytest.fixture
+def emulator_settings():
+    # Slow enough that the background readers always have a request in flight:
+    return EmulatorSettings(latency=0.01, seed=1)
+
+
+def test_read_after_write_sees_the_write(emulator):
+    stop = threading.Event()
+
+    def poll():
+        chamber = gcc(1)
+        while not stop.is_set():
+            chamber.get_humidity()
+
+    pollers = [threading.Thread(target=poll) for _ in range(4)]
+    for thread in pollers:
+        thread.start()
+
+    try:
+        chamber = gcc(1)
+        for trial in range(40):
+            enabled = trial % 2 == 0
+            if enabled:
+                chamber.enable_humidity()
+            else:
+                chamber.disable_humidity()
+
+            assert chamber.get_humidity()["humidification_enabled"] is enabled
+    finally:
+        stop.set()
+        for thread in pollers:
+            thread.join(5)
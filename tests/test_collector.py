@@ -0,0 +1,57 @@
+from breaker import CircuitBreaker
+from chamber import GrowthChamberControl as gcc
+from collector import collect, read_state
+from emulator import EmulatorSettings, PercivalEmulator
+
+
+class FlakyChamber:
+    chamber_id = 5
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def get_state(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("no route to host")
+        return {"chamber_id": self.chamber_id, "temperature_actual": 26.0}
+
+
+def test_retries_then_records_the_error():
+    assert read_state(FlakyChamber(failures=1), attempts=2)["temperature_actual"] == 26.0
+
+    record = read_state(FlakyChamber(failures=2), attempts=2)
+    assert record["type"] == "ConnectionError"
+    assert record["error"] == "no route to host"
+    assert record["attempts"] == 2
+    assert record["chamber_id"] == 5
+
+
+def test_open_breaker_skips_the_controller():
+    chamber = FlakyChamber(failures=10)
+    breaker = CircuitBreaker("chamber 5", failure_threshold=1)
+
+    read_state(chamber, breaker)
+    assert read_state(chamber, breaker)["type"] == "CircuitOpen"
+    assert chamber.calls == 1
+
+
+def test_unparseable_responses_become_error_records():
+    base_url = gcc.BASE_URL
+    with PercivalEmulator(settings=EmulatorSettings(malformed_rate=1.0)) as emu:
+        gcc.BASE_URL = emu.base_url
+        try:
+            states = collect([1, 2])
+        finally:
+            gcc.BASE_URL = base_url
+
+    assert all("type" in state for state in states.values())
+
+
+def test_collect_reads_every_chamber_in_order(emulator):
+    states = collect([3, 1, 2], max_concurrency=2)
+
+    assert list(states) == [3, 1, 2]
+    assert all(state["chamber_id"] == chamber_id for chamber_id, state in states.items())
+    assert states[1]["co2_target"] == 500.0
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import enviratron_logger
+from deadband import DELTA_KEY, DeltaEncoder, rebuild
+
+
+def reading(mode="Manual", co2=502.0, lighting=10000, **changes):
+    state = {
+        "co2_actual": co2,
+        "chamber_id": 1,
+        "env_var": "operating",
+        "env_val": mode,
+        "humidity_actual": 72.0,
+        **{f"lighting_{i}": lighting for i in range(1, 8)},
+        "door_state": False,
+        "operating_mode": mode,
+    }
+    state.update(changes)
+    return state
+
+
+STREAM = [
+    reading(),
+    reading(co2=502.4),
+    reading(co2=510.0),
+    reading(mode="Diurnal", co2=510.0),
+    reading(mode="Diurnal", co2=510.0),
+    {"chamber_id": 1, "type": "ConnectionError", "error": ""},
+    reading(mode="Diurnal", co2=510.0, lighting=5000),
+    reading(mode="Manual", co2=510.0, door_state=True),
+]
+
+
+def without_env(state):
+    return {k: v for k, v in state.items() if k not in ("env_var", "env_val")}
+
+
+def test_deltas_leave_out_unchanged_and_env_fields():
+    encoder = DeltaEncoder(keyframe_interval=600)
+    encoded = [encoder.encode(state, i) for i, state in enumerate(STREAM)]
+
+    assert DELTA_KEY not in encoded[0]
+    assert encoded[1] == {DELTA_KEY: True, "chamber_id": 1, "co2_actual": 502.4}
+    assert encoded[3] == {DELTA_KEY: True, "chamber_id": 1, "operating_mode": "Diurnal"}
+    assert encoded[4] == {DELTA_KEY: True, "chamber_id": 1}
+    assert encoded[6] == {
+        DELTA_KEY: True,
+        "chamber_id": 1,
+        **{f"lighting_{i}": 5000 for i in range(1, 8)},
+    }
+
+
+def test_deadbands_hold_back_small_changes():
+    encoder = DeltaEncoder(keyframe_interval=600, deadbands={"co2_actual": 5})
+    encoded = [encoder.encode(state, i) for i, state in enumerate(STREAM[:3])]
+
+    assert "co2_actual" not in encoded[1]
+    assert encoded[2]["co2_actual"] == 510.0
+
+
+def test_keyframes_are_written_on_the_interval():
+    encoder = DeltaEncoder(keyframe_interval=10)
+    encoded = [encoder.encode(state, now) for state, now in zip(STREAM, (0, 5, 10, 15))]
+
+    assert [DELTA_KEY in state for state in encoded] == [False, True, False, True]
+
+
+@pytest.mark.parametrize("fast_json", [False, True])
+def test_logged_deltas_rebuild_into_the_full_records(tmp_path, fast_json):
+    def log_stream(log_dir, deadband):
+        logger = enviratron_logger.get_logger(
+            1, log_dir, fast_json=fast_json, deadband=deadband
+        )
+        for state in STREAM:
+            enviratron_logger.log_state(logger, dict(state))
+        enviratron_logger.release_logger(1)
+
+        with open(log_dir / "chamber_1_environment.log") as log_file:
+            records = [json.loads(line) for line in log_file]
+        for record in records:
+            del record["timestamp"], record["level"]
+        return records
+
+    (tmp_path / "full").mkdir()
+    (tmp_path / "deadband").mkdir()
+    full = log_stream(tmp_path / "full", None)
+    deltas = log_stream(tmp_path / "deadband", {"keyframe_interval": 600})
+
+    assert any(record.get(DELTA_KEY) for record in deltas)
+    assert all("env_val" not in record and "env_var" not in record for record in deltas)
+    assert list(rebuild(deltas)) == full
+    logged = dict(STREAM[0], **{f"lighting_{i}": 100.0 for i in range(1, 8)})
+    assert full[0] == without_env(logged)
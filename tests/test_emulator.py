@@ -0,0 +1,60 @@
+import time
+
+import requests
+
+from chamber import GrowthChamberControl as gcc
+from emulator import EmulatorSettings, PercivalEmulator
+
+
+def seconds_of_day(clock):
+    return clock["hour"] * 3600 + clock["minute"] * 60 + clock["second"]
+
+
+def local_seconds_of_day():
+    now = time.localtime()
+    return now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec
+
+
+def clock_skew(clock):
+    # Within a few seconds of each other, also across midnight:
+    return min(abs(seconds_of_day(clock) - local_seconds_of_day()) % 86400,
+               86400 - abs(seconds_of_day(clock) - local_seconds_of_day()) % 86400)
+
+
+def test_get_time_follows_the_wall_clock(emulator):
+    clock = gcc(1).get_time()
+
+    assert set(clock) == {"hour", "minute", "second", "chamber_id"}
+    assert clock_skew(clock) <= 2
+
+
+def test_written_clock_keeps_ticking_and_set_time_resets_it(emulator):
+    chamber = gcc(1)
+    chamber._GrowthChamberControl__make_set_request(
+        {"Real_Time_Hour": 3, "Real_Time_Minute": 4, "Real_Time_Second": 5}
+    )
+    clock = chamber.get_time()
+    assert (clock["hour"], clock["minute"]) == (3, 4) and 5 <= clock["second"] <= 7
+
+    chamber.set_time()
+    assert clock_skew(chamber.get_time()) <= 2
+
+
+def test_writes_are_read_back(emulator):
+    chamber = gcc(2)
+    chamber.set_temperature(21.5)
+    chamber.set_lighting(4)
+    chamber.close_door()
+    chamber.set_mode("nr_diurnal")
+
+    state = chamber.get_state()
+    assert state["temperature_target"] == 21.5
+    assert state["lighting_1"] == 4000
+    assert state["door_state"] is False
+    assert state["operating_mode"] == "Diurnal"
+
+
+def test_malformed_responses_are_truncated():
+    with PercivalEmulator(settings=EmulatorSettings(malformed_rate=1.0, seed=1)) as emulator:
+        url = emulator.base_url.format(1) + "/read_data.xml?Cmd=read&Tag=PV_1"
+        assert not requests.get(url).content.endswith(b"</Req>")
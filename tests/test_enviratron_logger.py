@@ -0,0 +1,92 @@
+import logging
+from pathlib import Path
+
+import enviratron_logger
+import scheduler
+
+
+class BrokenSink:
+    def add(self, state, timestamp=None):
+        raise TypeError("can't handle that")
+
+    def write_cycle(self, states, timestamp=None):
+        raise TypeError("can't handle that")
+
+
+class ListSink:
+    def __init__(self):
+        self.states = []
+
+    def add(self, state, timestamp=None):
+        self.states.append(state)
+
+    def write_cycle(self, states, timestamp=None):
+        self.states.extend(states.values())
+
+
+def test_a_failing_sink_does_not_keep_readings_from_the_others(monkeypatch):
+    handlers = []
+    monkeypatch.setattr(scheduler, "run", lambda schedule, handle_state, **kwargs: handlers.append(handle_state))
+
+    sink = ListSink()
+    loggers = {1: logging.getLogger("test_chamber_1")}
+    enviratron_logger.run_daemon(loggers, sinks=[BrokenSink(), sink])
+
+    state = {"chamber_id": 1, "temperature_actual": "----"}
+    handlers[0](1, state)
+
+    assert sink.states == [state]
+
+
+def test_run_cycle_isolates_sinks(emulator):
+    sink = ListSink()
+    loggers = {1: logging.getLogger("test_chamber_1"), 2: logging.getLogger("test_chamber_2")}
+    enviratron_logger.run_cycle(loggers, sinks=[BrokenSink(), sink])
+
+    assert sorted(state["chamber_id"] for state in sink.states) == [1, 2]
+
+
+def test_registry_never_attaches_a_second_handler(tmp_path):
+    registry = enviratron_logger.LoggerRegistry()
+
+    try:
+        logger = registry.get(91, tmp_path)
+        assert registry.get(91, tmp_path) is logger
+        assert len(logger.handlers) == 1
+
+        # A new log directory replaces the handler rather than adding one:
+        (tmp_path / "moved").mkdir()
+        registry.get(91, tmp_path / "moved")
+        assert len(logger.handlers) == 1
+
+        registry.get(92, tmp_path)
+        registry.retain([92])
+        assert registry.chamber_ids() == [92]
+        assert logger.handlers == []
+    finally:
+        registry.close()
+
+
+def test_load_config_defaults(tmp_path):
+    config_path = tmp_path / "logger.yml"
+    config_path.write_text(f"log_directory: {tmp_path / 'logs'}\nmax_concurrency: 4\n")
+
+    config = enviratron_logger.load_config(str(config_path))
+
+    assert config["log_directory"].is_dir()
+    assert config["chamber_ids"] == enviratron_logger.DEFAULT_CHAMBER_IDS
+    assert config["max_concurrency"] == 4
+    assert config["attempts"] == 1
+    assert enviratron_logger.load_config()["log_directory"] == Path(".")
+
+
+def test_rate_limit_is_off_unless_configured(tmp_path):
+    config_path = tmp_path / "logger.yml"
+
+    assert enviratron_logger.load_config()["rate_limit"] is None
+
+    config_path.write_text("rate_limit: true\n")
+    assert enviratron_logger.load_config(str(config_path))["rate_limit"] == {}
+
+    config_path.write_text("rate_limit: {rate: 2, max_wait: 5}\n")
+    assert enviratron_logger.load_config(str(config_path))["rate_limit"] == {"rate": 2, "max_wait": 5}
@@ -0,0 +1,45 @@
+import json
+
+from follower import ErrorRecord, Reading, follower_for
+from history import log_path_for
+from rotation import compress_segment
+
+
+def line(minute, **values):
+    return json.dumps({"timestamp": f"2021-09-15T12:{minute:02d}:00.000000Z", "level": "INFO",
+                       "chamber_id": 1, **values}) + "\n"
+
+
+def numbers(records):
+    return [record.values.get("n") for record in records]
+
+
+def test_follows_across_rotation_and_compression(tmp_path):
+    log_path = log_path_for(tmp_path, 1)
+    log_path.write_text(line(0, n=0) + line(1, n=1))
+
+    records = list(follower_for(tmp_path, 1, "test").poll())
+    assert numbers(records) == [0, 1]
+    assert isinstance(records[0], Reading) and records[0].chamber_id == 1
+
+    # A line still being written is left for the next poll:
+    partial = line(3, n=3)
+    with log_path.open("a") as log:
+        log.write(line(2, n=2) + partial[:20])
+    assert numbers(follower_for(tmp_path, 1, "test").poll()) == [2]
+
+    # Finished, then rotated and compressed before the follower gets to it:
+    with log_path.open("a") as log:
+        log.write(partial[20:])
+    segment = log_path.with_name("chamber_1_environment.20210915T120000.log")
+    log_path.rename(segment)
+    compress_segment(segment, "gzip")
+    log_path.write_text(line(4, n=4) + line(5, type="ConnectionError", error="timed out"))
+
+    records = list(follower_for(tmp_path, 1, "test").poll())
+    assert numbers(records) == [3, 4, None]
+    assert isinstance(records[-1], ErrorRecord) and records[-1].error == "timed out"
+
+    assert list(follower_for(tmp_path, 1, "test").poll()) == []
+    # Every consumer has its own checkpoint:
+    assert numbers(follower_for(tmp_path, 1, "other").poll()) == [4, None]
@@ -0,0 +1,47 @@
+import json
+import logging
+
+import pytest
+
+from enviratron_logger import CustomJsonFormatter, FastJsonFormatter
+
+FORMAT = "%(timestamp)s %(level)s %(message)s"
+
+READING = {
+    "co2_actual": 502.3, "chamber_id": 1, "env_var": "operating", "env_val": "Manual",
+    "co2_target": 500.0, "humidification_enabled": True, "lighting_1": 10000, "lighting_2": "----",
+    "temperature_actual": 26.0, "door_state": False, "operating_mode": "Manual",
+}
+
+
+def make_record(message):
+    return logging.makeLogRecord(
+        {"name": "chamber_1_logger", "levelname": "INFO", "msg": message, "created": 1631727732.5}
+    )
+
+
+def test_readings_are_logged_without_env_fields_and_lighting_scaled():
+    logged = json.loads(CustomJsonFormatter(FORMAT).format(make_record(READING)))
+
+    assert logged["timestamp"].endswith("Z") and logged["level"] == "INFO"
+    assert "env_var" not in logged and "env_val" not in logged
+    assert (logged["lighting_1"], logged["lighting_2"]) == (100.0, "----")
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        READING,
+        dict(READING, co2_actual=float("nan"), temperature_actual=0.00001, operating_mode="Manüal"),
+        {"type": "ConnectionError", "chamber_id": 1, "error": "", "elapsed": 3.0, "attempts": 1},
+        "collection cycle took 1.2s",
+    ],
+)
+def test_fast_formatter_writes_the_same_bytes(message):
+    record = make_record(message)
+    custom = CustomJsonFormatter(FORMAT).format(record)
+    fast = FastJsonFormatter(FORMAT)
+
+    # Twice, the second time from the cached plan:
+    assert fast.format(record) == custom
+    assert fast.format(record) == custom
@@ -0,0 +1,36 @@
+import gzip
+import json
+from datetime import datetime
+
+from history import log_path_for, read_chamber
+
+
+def line(minute, **values):
+    return json.dumps({"timestamp": f"2021-09-15T12:{minute:02d}:00.000000Z", "level": "INFO",
+                       "chamber_id": 1, **values}) + "\n"
+
+
+def test_ranges_span_segments_and_rebuild_deltas(tmp_path):
+    segment = tmp_path / "chamber_1_environment.20210915T120000.log.gz"
+    with gzip.open(segment, "wt") as log:
+        for minute in range(5):
+            log.write(line(minute, n=minute, co2_actual=500.0))
+
+    # A keyframe, then deltas that only carry what changed:
+    with log_path_for(tmp_path, 1).open("w") as log:
+        log.write(line(5, n=5, co2_actual=500.0))
+        for minute in range(6, 10):
+            log.write(line(minute, delta=True, n=minute))
+        log.write(line(10, type="ConnectionError", error="", elapsed=3.0, attempts=1))
+
+    records = list(read_chamber(tmp_path, 1, datetime(2021, 9, 15, 12, 3),
+                                datetime(2021, 9, 15, 12, 8)))
+    assert [record["n"] for record in records] == [3, 4, 5, 6, 7]
+    # Rebuilt from the keyframe before the range:
+    assert records[-1]["co2_actual"] == 500.0
+    assert "delta" not in records[-1]
+
+    (error,) = read_chamber(tmp_path, 1, start="2021-09-15T12:09:30")
+    assert error["type"] == "ConnectionError"
+
+    assert len(list(read_chamber(tmp_path, 1))) == 11
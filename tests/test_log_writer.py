@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from log_writer import QueuedLogWriter, QueuedSinkWriter
+
+
+def record(message):
+    return logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None)
+
+
+def dropped_warnings(caplog):
+    return [r for r in caplog.records if r.name == "enviratron_log_writer"]
+
+
+def test_invalid_overflow_policy():
+    with pytest.raises(ValueError):
+        QueuedLogWriter(overflow="drop_everything")
+
+
+@pytest.mark.parametrize("overflow, kept", [("drop_newest", "a"), ("drop_oldest", "c")])
+def test_overflow_policies(overflow, kept):
+    writer = QueuedLogWriter(maxsize=1, overflow=overflow)
+    for message in "abc":
+        writer.put(record(message))
+
+    assert writer.stats() == {"depth": 1, "maxsize": 1, "dropped": 2, "overflow": overflow}
+    assert writer.queue.get_nowait().msg == kept
+
+
+def test_drops_are_reported_once(caplog):
+    writer = QueuedLogWriter(maxsize=1, overflow="drop_newest", stats_interval=0)
+    for message in "abc":
+        writer.put(record(message))
+
+    with caplog.at_level(logging.WARNING, logger="enviratron_log_writer"):
+        writer.report()
+        writer.report()
+
+    (warning,) = dropped_warnings(caplog)
+    assert "2 record(s) dropped" in warning.getMessage()
+
+
+def test_drops_are_reported_periodically_and_at_stop(caplog, tmp_path):
+    writer = QueuedLogWriter(maxsize=1, overflow="drop_newest", stats_interval=0.05)
+    handler = logging.FileHandler(tmp_path / "test.log")
+    writer.handler_for("test", handler)
+
+    with caplog.at_level(logging.WARNING, logger="enviratron_log_writer"):
+        for message in "ab":
+            writer.put(record(message))
+        writer.start()
+        deadline = time.monotonic() + 5
+        while not dropped_warnings(caplog) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(dropped_warnings(caplog)) == 1
+
+        # Nothing is dropped on the way out of a queue that's being drained:
+        writer.put(record("c"))
+        writer.stop()
+
+    handler.close()
+    assert len(dropped_warnings(caplog)) == 1
+    assert (tmp_path / "test.log").read_text().split() == ["a", "c"]
+
+
+class SlowSink:
+    def __init__(self):
+        self.calls = []
+        self.closed = False
+
+    def add(self, state, timestamp=None):
+        time.sleep(0.2)
+        self.calls.append(("add", state, timestamp, threading.get_ident()))
+
+    def write_cycle(self, states, timestamp=None):
+        self.calls.append(("write_cycle", states, timestamp, threading.get_ident()))
+
+    def close(self):
+        self.closed = True
+
+
+class BrokenSink(SlowSink):
+    def add(self, state, timestamp=None):
+        raise TypeError("can't handle that")
+
+
+def test_sink_writer_only_enqueues(caplog):
+    sink = SlowSink()
+    writer = QueuedSinkWriter([BrokenSink(), sink], stats_interval=0)
+    writer.start()
+
+    started, added = time.monotonic(), time.time()
+    with caplog.at_level(logging.ERROR, logger="enviratron_sinks"):
+        writer.add({"chamber_id": 1}, 10.0)
+        writer.add({"chamber_id": 2})
+        writer.write_cycle({1: {"chamber_id": 1}}, 20.0)
+        assert time.monotonic() - started < 0.1
+
+        writer.close()
+
+    assert [(method, timestamp) for method, _, timestamp, _ in sink.calls[::2]] == [
+        ("add", 10.0),
+        ("write_cycle", 20.0),
+    ]
+    # Stamped when it was added, not when it was written:
+    assert sink.calls[1][2] <= added + 0.1
+    assert threading.get_ident() not in {thread for *_, thread in sink.calls}
+    assert sink.closed
+    assert len([r for r in caplog.records if r.name == "enviratron_sinks"]) == 2
@@ -0,0 +1,85 @@
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "enviratron_logger" / "enviratron_logger.py"
+
+
+def write_config(path, emulator, **settings):
+    lines = [
+        f"base_url: {emulator.base_url}",
+        f"log_directory: {path.parent / 'logs'}",
+        "chamber_ids: [1, 2]",
+        *(f"{key}: {value}" for key, value in settings.items()),
+    ]
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def count_lines(log_dir):
+    return sum(len(path.read_text().splitlines()) for path in log_dir.glob("*.log"))
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs POSIX signals")
+def test_sigterm_writes_out_everything_before_exiting(tmp_path, emulator):
+    database = tmp_path / "chambers.sqlite3"
+    config = write_config(tmp_path / "logger.yml", emulator, interval=1, sqlite_path=database)
+    daemon = subprocess.Popen(
+        [sys.executable, str(SCRIPT), "--daemon", str(config)],
+        cwd=tmp_path,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+
+    try:
+        deadline = time.monotonic() + 20
+        while count_lines(tmp_path / "logs") < 5:
+            assert daemon.poll() is None, daemon.stdout.read().decode()
+            assert time.monotonic() < deadline, "the daemon never logged"
+            time.sleep(0.1)
+
+        daemon.send_signal(signal.SIGTERM)
+        assert daemon.wait(timeout=20) == 0, daemon.stdout.read().decode()
+    finally:
+        if daemon.poll() is None:
+            daemon.kill()
+            daemon.wait()
+
+    with sqlite3.connect(database) as connection:
+        (rows,) = connection.execute("SELECT COUNT(*) FROM readings").fetchone()
+    assert rows == count_lines(tmp_path / "logs")
+
+
+def test_one_shot_runs_leave_the_state_api_port_alone(tmp_path, emulator):
+    # e.g. the daemon's API, already listening:
+    with socket.socket() as taken:
+        taken.bind(("127.0.0.1", 0))
+        taken.listen()
+        port = taken.getsockname()[1]
+        config = write_config(
+            tmp_path / "logger.yml", emulator, state_api=f"{{host: 127.0.0.1, port: {port}}}"
+        )
+
+        run = subprocess.run(
+            [sys.executable, str(SCRIPT), str(config)], cwd=tmp_path, capture_output=True, timeout=60
+        )
+
+    assert run.returncode == 0, run.stderr.decode()
+    assert count_lines(tmp_path / "logs") == 2
+
+
+def test_one_shot_runs_warn_that_deadband_needs_the_daemon(tmp_path, emulator):
+    config = write_config(tmp_path / "logger.yml", emulator, deadband="{keyframe_interval: 600}")
+
+    run = subprocess.run(
+        [sys.executable, str(SCRIPT), str(config)], cwd=tmp_path, capture_output=True, timeout=60
+    )
+
+    assert run.returncode == 0, run.stderr.decode()
+    assert "deadband is set without --daemon" in run.stderr.decode()
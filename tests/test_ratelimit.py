@@ -0,0 +1,36 @@
+import pytest
+
+from ratelimit import ControllerLimiter, RateLimitExceeded
+
+
+def test_token_bucket_allows_bursts_then_the_rate(clock):
+    limiter = ControllerLimiter("chamber 1", rate=2, burst=2, max_in_flight=0, max_wait=0,
+                                clock=clock)
+
+    for _ in range(2):
+        with limiter:
+            pass
+
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire()
+
+    # Two tokens a second:
+    clock.now = 0.5
+    with limiter:
+        pass
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire()
+    assert limiter.waiting == 0
+
+
+def test_max_in_flight():
+    limiter = ControllerLimiter("chamber 1", rate=0, max_in_flight=1, max_wait=0)
+
+    limiter.acquire()
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire()
+
+    limiter.release()
+    with limiter:
+        assert limiter.in_flight == 1
+    assert limiter.in_flight == 0
@@ -0,0 +1,77 @@
+from records import LIGHTING_KEYS, BufferedSink, as_logged, is_number, is_reading
+
+
+def test_is_reading():
+    assert is_reading({"chamber_id": 1, "co2_actual": 500.0})
+    assert not is_reading({"chamber_id": 1, "type": "ReadTimeout"})
+    assert not is_reading("a plain log message")
+
+
+def test_is_number():
+    assert is_number(1) and is_number(1.5)
+    assert not is_number(True) and not is_number("----") and not is_number(None)
+
+
+def test_as_logged_matches_the_logs():
+    state = {
+        "co2_actual": 502.0,
+        "chamber_id": 1,
+        "env_var": "lighting",
+        "env_val": 5000,
+        **{key: 5000 for key in LIGHTING_KEYS},
+        "door_state": False,
+    }
+
+    logged = as_logged(state)
+
+    assert list(logged) == ["co2_actual", "chamber_id", *LIGHTING_KEYS, "door_state"]
+    assert all(logged[key] == 50.0 for key in LIGHTING_KEYS)
+    # The original is left alone:
+    assert state["lighting_1"] == 5000 and "env_val" in state
+
+
+def test_as_logged_leaves_text_levels_alone():
+    assert as_logged({"chamber_id": 1, "lighting_2": "----"}) == {
+        "chamber_id": 1,
+        "lighting_2": "----",
+    }
+
+
+class ListSink(BufferedSink):
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        self.buffered = []
+        self.batches = []
+        self.closed = False
+
+    def _buffer(self, state, timestamp):
+        self.buffered.append(state)
+
+    def _write(self):
+        if self.buffered:
+            self.batches.append(self.buffered)
+        self.buffered = []
+
+    def _close(self):
+        self.closed = True
+
+
+def test_buffered_sink_writes_on_size_and_age():
+    sink = ListSink(batch_size=3, max_delay=60)
+
+    sink.add({"chamber_id": 1}, 0.0)
+    sink.add({"chamber_id": 2, "type": "ReadTimeout"}, 1.0)
+    assert sink.batches == []
+    # Error records count towards the batch:
+    sink.add({"chamber_id": 3}, 2.0)
+    assert [len(batch) for batch in sink.batches] == [3]
+
+    sink.add({"chamber_id": 1}, 100.0)
+    sink.add({"chamber_id": 2}, 160.0)
+    assert [len(batch) for batch in sink.batches] == [3, 2]
+
+    sink.write_cycle({1: {"chamber_id": 1}}, 170.0)
+    sink.add({"chamber_id": 2}, 171.0)
+    sink.close()
+    assert [len(batch) for batch in sink.batches] == [3, 2, 1, 1]
+    assert sink.closed
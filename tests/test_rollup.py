@@ -0,0 +1,60 @@
+import json
+import math
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+import history
+from rollup import parse_width, rollup
+
+
+def write_log(log_dir, chamber_id, records):
+    with history.log_path_for(log_dir, chamber_id).open("w") as log:
+        for record in records:
+            log.write(json.dumps({"level": "INFO", "chamber_id": chamber_id, **record}) + "\n")
+
+
+def test_parse_width():
+    assert parse_width("90s") == 90_000_000
+    assert parse_width("1h") == 3_600_000_000
+    assert parse_width(0.5) == 500_000
+
+    with pytest.raises(ValueError):
+        parse_width("0m")
+    with pytest.raises(ValueError):
+        parse_width("soon")
+
+
+def test_non_numeric_values_count_as_missing(tmp_path):
+    write_log(
+        tmp_path,
+        1,
+        [
+            {"timestamp": "2021-09-15T12:00:00.000000Z", "co2_actual": 500.0, "lighting_1": 100.0},
+            {"timestamp": "2021-09-15T12:10:00.000000Z", "co2_actual": 520.0, "lighting_1": "----"},
+            {"timestamp": "2021-09-15T12:20:00.000000Z", "type": "timeout", "error": "timed out"},
+            {"timestamp": "2021-09-15T13:00:00.000000Z", "co2_actual": 540.0, "lighting_1": 50.0},
+        ],
+    )
+
+    hourly = rollup(tmp_path, 1, "1h", use_cache=False)
+
+    assert hourly["start"].astype(str).tolist() == [
+        "2021-09-15T12:00:00.000000",
+        "2021-09-15T13:00:00.000000",
+    ]
+    assert hourly["count"].tolist() == [2, 1]
+    assert hourly["co2_actual_mean"].tolist() == [510.0, 540.0]
+    assert hourly["lighting_1_mean"].tolist() == [100.0, 50.0]
+    assert math.isnan(hourly["humidity_actual_mean"][0])
+
+
+def test_cached_rollup_follows_the_log(tmp_path):
+    records = [{"timestamp": "2021-09-15T12:00:00.000000Z", "co2_actual": 500.0}]
+    write_log(tmp_path, 1, records)
+    assert rollup(tmp_path, 1, "1h")["co2_actual_max"].tolist() == [500.0]
+
+    records.append({"timestamp": "2021-09-15T12:30:00.000000Z", "co2_actual": 600.0})
+    write_log(tmp_path, 1, records)
+    assert rollup(tmp_path, 1, "1h")["co2_actual_max"].tolist() == [600.0]
@@ -0,0 +1,55 @@
+import json
+import logging
+import time
+
+from rotation import (
+    RotatingChamberFileHandler,
+    _get_compressor,
+    compress_in_background,
+    open_segment,
+    segment_paths,
+)
+
+
+def wait_for_compressor():
+    # One worker thread, so this runs after everything submitted so far (and its callbacks):
+    _get_compressor().submit(lambda: None).result()
+
+
+def record(n):
+    line = json.dumps({"timestamp": "2021-09-15T12:42:12.882954Z", "n": n})
+    return logging.makeLogRecord({"msg": line, "created": time.time()})
+
+
+def test_size_rotation_compresses_segments(tmp_path):
+    log_path = tmp_path / "chamber_1_environment.log"
+    handler = RotatingChamberFileHandler(log_path, max_bytes=100)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+
+    for n in range(6):
+        handler.handle(record(n))
+    handler.close()
+    wait_for_compressor()
+
+    paths = segment_paths(log_path)
+    assert paths[-1] == log_path
+    assert len(paths) > 2
+    assert all(path.suffix == ".gz" for path in paths[:-1])
+
+    numbers = []
+    for path in paths:
+        with open_segment(path) as segment:
+            numbers.extend(json.loads(line)["n"] for line in segment)
+    assert numbers == list(range(6))
+
+
+def test_failed_compression_is_logged(tmp_path, caplog):
+    missing = tmp_path / "chamber_1_environment.20210915T124212.log"
+
+    with caplog.at_level(logging.ERROR, logger="enviratron_rotation"):
+        compress_in_background(missing, "gzip")
+        wait_for_compressor()
+
+    (logged,) = caplog.records
+    assert str(missing) in logged.getMessage()
+    assert logged.exc_info[0] is FileNotFoundError
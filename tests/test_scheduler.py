@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+import scheduler
+
+
+def test_next_deadline_is_on_the_epoch_grid():
+    assert scheduler.next_deadline(1003.2, 10) == 1010
+    assert scheduler.next_deadline(1010.0, 10) == 1020
+    assert scheduler.next_deadline(1003.2, 10, offset=5) == 1005
+
+
+def test_build_schedule_spreads_chambers_across_their_interval():
+    schedule = scheduler.build_schedule([1, 2, 3, 4], 8, chamber_intervals={4: 2})
+    assert schedule == [(1, 8.0, 0.0), (2, 8.0, 2.0), (3, 8.0, 4.0), (4, 2.0, 1.5)]
+
+
+def test_a_failing_handler_does_not_stop_the_other_chambers(emulator):
+    handled = []
+
+    def handle_state(chamber_id, state):
+        if chamber_id == 1:
+            raise ValueError("broken sink")
+        handled.append((chamber_id, time.time()))
+
+    async def run_briefly():
+        task = asyncio.ensure_future(
+            scheduler.run_schedule(scheduler.build_schedule([1, 2], 0.2), handle_state)
+        )
+        await asyncio.sleep(1.1)
+        assert not task.done()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run_briefly())
+
+    assert len(handled) >= 4
+    assert {chamber_id for chamber_id, _ in handled} == {2}
@@ -0,0 +1,91 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from sqlite_sink import SQLiteSink, to_epoch
+
+MIDNIGHT = datetime(2021, 9, 15)
+
+
+@pytest.fixture
+def chicago(monkeypatch):
+    """Local time that isn't UTC, so local and UTC interpretations differ"""
+    monkeypatch.setenv("TZ", "America/Chicago")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def sink(tmp_path):
+    sink = SQLiteSink(tmp_path / "chambers.sqlite3")
+    yield sink
+    sink.close()
+
+
+def test_naive_datetimes_are_local_time(chicago):
+    assert to_epoch(MIDNIGHT) == MIDNIGHT.timestamp()
+    assert to_epoch(MIDNIGHT) != MIDNIGHT.replace(tzinfo=timezone.utc).timestamp()
+    aware = datetime(2021, 9, 15, tzinfo=timezone.utc)
+    assert to_epoch(aware) == aware.timestamp()
+    assert to_epoch(12.5) == 12.5
+
+
+def test_readings_and_errors_round_trip(sink):
+    sink.write_cycle(
+        {
+            1: {
+                "co2_actual": 502.0,
+                "chamber_id": 1,
+                "lighting_1": 10000,
+                "door_state": True,
+                "operating_mode": "Manual",
+                "light_meter": 850.0,
+            },
+            2: {"chamber_id": 2, "type": "ConnectionError", "error": "", "attempts": 2},
+        },
+        MIDNIGHT.timestamp(),
+    )
+
+    (reading,) = sink.query(1)
+    assert reading == {
+        "chamber_id": 1,
+        "timestamp": MIDNIGHT.timestamp(),
+        "co2_actual": 502.0,
+        "lighting_1": 100.0,
+        "door_state": True,
+        "operating_mode": "Manual",
+        "light_meter": 850.0,
+    }
+    assert sink.query(2) == []
+    assert sink.query(2, table="errors")[0]["type"] == "ConnectionError"
+
+
+def test_query_window_uses_local_time(chicago, sink):
+    for hour in range(4):
+        moment = MIDNIGHT + timedelta(hours=hour)
+        sink.add({"chamber_id": 1, "co2_actual": float(hour)}, moment.timestamp())
+    sink.flush()
+
+    rows = sink.query(1, start=MIDNIGHT + timedelta(hours=1), end=MIDNIGHT + timedelta(hours=3))
+    assert [row["co2_actual"] for row in rows] == [1.0, 2.0]
+
+
+def test_batches_flush_on_size(tmp_path):
+    sink = SQLiteSink(tmp_path / "chambers.sqlite3", batch_size=2, max_delay=3600)
+    sink.add({"chamber_id": 1, "co2_actual": 1.0}, 0.0)
+    assert sink.query(1) == []
+    sink.add({"chamber_id": 2, "type": "ReadTimeout"}, 0.0)
+    assert len(sink.query(1)) == 1
+    sink.close()
+
+
+def test_non_numeric_values_are_stored_as_sent(sink):
+    sink.add({"chamber_id": 1, "lighting_1": "----", "co2_actual": "----", "env_val": 1}, 0.0)
+    sink.flush()
+
+    (reading,) = sink.query(1)
+    assert reading["lighting_1"] == reading["co2_actual"] == "----"
+    assert "env_val" not in reading
@@ -0,0 +1,50 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from state_api import LatestStates, StateAPI
+
+
+@pytest.fixture
+def api():
+    states = LatestStates()
+    with StateAPI(states, port=0) as api:
+        yield api
+
+
+def get(api, path):
+    with urllib.request.urlopen(api.url + path, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def test_latest_reading_and_error_are_served(api):
+    api.states.add({"chamber_id": 1, "env_var": "x", "env_val": 1, "lighting_1": 5000}, 100.0)
+    api.states.add({"chamber_id": 1, "type": "ReadTimeout", "error": "slow"}, 160.0)
+    api.states.write_cycle({2: {"chamber_id": 2, "co2_actual": 455.0}})
+
+    one = get(api, "/states/1")
+    assert one["chamber_id"] == 1
+    assert one["state"] == {"chamber_id": 1, "lighting_1": 50.0}
+    assert one["last_error"]["type"] == "ReadTimeout"
+    assert one["age"] > 0
+
+    everything = get(api, "/states")
+    assert set(everything) == {"1", "2"}
+    assert everything["2"]["last_error"] is None
+    assert everything["2"]["state"]["co2_actual"] == 455.0
+
+
+def test_unknown_chambers_and_paths_are_404(api):
+    for path in ("/states/9", "/nope"):
+        with pytest.raises(urllib.error.HTTPError) as error:
+            get(api, path)
+        assert error.value.code == 404
+
+
+def test_an_error_before_any_reading(api):
+    api.states.add({"chamber_id": 3, "type": "ConnectionError", "error": ""})
+
+    three = get(api, "/states/3")
+    assert three["state"] is None and three["collected_at"] is None and three["age"] is None
@@ -0,0 +1,59 @@
+from tiers import TieredReader
+
+
+class FakeChamber:
+    chamber_id = 1
+
+    def __init__(self):
+        self.reads = []
+        self.co2 = 500.0
+
+    def get_state(self):
+        self.reads.append("full")
+        return {"co2_actual": self.co2, "chamber_id": 1, "env_var": "co2", "env_val": self.co2,
+                "co2_target": 500.0, "operating_mode": "Manual"}
+
+    def get_fast_state(self):
+        self.reads.append("fast")
+        if self.co2 is None:
+            return {"type": "ConnectionError"}
+        return {"co2_actual": self.co2, "chamber_id": 1, "env_var": "co2", "env_val": self.co2}
+
+
+def test_fast_reads_between_full_ones(clock):
+    chamber = FakeChamber()
+    reader = TieredReader(chamber, slow_interval=300, clock=clock)
+
+    first = reader.get_state()
+
+    clock.now = 60
+    chamber.co2 = 520.0
+    second = reader.get_state()
+    # Complete, in the usual key order, with the fast values and the last full read's targets:
+    assert list(second) == list(first)
+    assert second["co2_actual"] == 520.0
+    assert second["co2_target"] == 500.0
+    # The env_var/env_val pair is that of the full read, like chamber_id:
+    assert second["env_val"] == 500.0
+
+    clock.now = 300
+    reader.get_state()
+    assert chamber.reads == ["full", "fast", "full"]
+
+
+def test_failed_fast_reads_are_passed_on(clock):
+    chamber = FakeChamber()
+    reader = TieredReader(chamber, slow_interval=300, clock=clock)
+
+    reader.get_state()
+    chamber.co2 = None
+    assert reader.get_state() == {"type": "ConnectionError"}
+
+
+def test_zero_interval_always_reads_everything(clock):
+    chamber = FakeChamber()
+    reader = TieredReader(chamber, slow_interval=0, clock=clock)
+
+    reader.get_state()
+    reader.get_state()
+    assert chamber.reads == ["full", "full"]